@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 from dotenv import load_dotenv
 
 # Load environment variables (optional, safe to keep)
@@ -137,3 +138,76 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = [
     BASE_DIR / 'static'
 ]
+
+# Quiz attempt write-behind (learning/write_behind.py). When on, submit_quiz
+# spools attempts (one file per process, named after SPOOL) without writing to
+# the database, and a flusher applies them with their XP, counters and badges
+# in batches of BATCH_SIZE, or every INTERVAL seconds, to keep SQLite's single
+# writer lock free during bursts.
+LEARNING_WRITE_BEHIND = os.environ.get('LEARNING_WRITE_BEHIND') == '1'
+LEARNING_WRITE_BEHIND_SPOOL = BASE_DIR / 'var' / 'attempt_spool.jsonl'
+LEARNING_WRITE_BEHIND_BATCH_SIZE = 500
+LEARNING_WRITE_BEHIND_INTERVAL = 2.0
+
+# QuizAttempt and legacy UserAnswer retention (manage.py archive_answers)
+LEARNING_ANSWER_RETENTION_DAYS = 180
+LEARNING_ARCHIVE_DIR = BASE_DIR / 'var' / 'archive'
+
+# Chat assistant LLM client (chat/llm.py). Set CHAT_LLM_BACKEND=chat.llm.StubBackend
+# to answer locally without network access (tests, load tests).
+CHAT_LLM_BACKEND = os.environ.get('CHAT_LLM_BACKEND', 'chat.llm.GroqBackend')
+CHAT_LLM_API_KEY = os.environ.get('GROQ_API_KEY', '')
+CHAT_LLM_MODEL = 'llama-3.1-8b-instant'
+CHAT_LLM_TIMEOUT = (3.05, 30.0)  # (connect, read) seconds
+CHAT_LLM_MAX_RETRIES = 2
+CHAT_LLM_POOL_SIZE = 10
+CHAT_LLM_BREAKER_THRESHOLD = 5
+CHAT_LLM_BREAKER_COOLDOWN = 30.0
+CHAT_LLM_STUB_DELAY = 0.0
+
+# Chat reply cache (chat/response_cache.py): identical questions within
+# CHAT_CACHE_TTL seconds are answered without calling the provider.
+CHAT_CACHE_ENABLED = True
+CHAT_CACHE_TTL = 60 * 60 * 24
+CHAT_CACHE_MAX_ENTRIES = 5000
+
+# The default cache is shared by every process (web workers and management
+# commands such as import_content), so the version tokens that invalidate the
+# chapter catalog, quiz answer keys and badge catalog reach all of them.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'var' / 'cache',
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+    'chat': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'chat-replies',
+        'TIMEOUT': CHAT_CACHE_TTL,
+        'OPTIONS': {'MAX_ENTRIES': CHAT_CACHE_MAX_ENTRIES},
+    },
+}
+# manage.py test gets a private in-memory default cache: tests clear it freely
+# and must never read entries keyed by ids from an earlier test database.
+if sys.argv[1:2] == ['test']:
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tests',
+    }
+
+# Identical chat questions asked at the same time share one provider call
+# (chat/singleflight.py); other processes are found through an InflightPrompt
+# row. Waiters give up after CHAT_COALESCE_WAIT seconds, which must exceed the
+# longest a provider call can take with retries.
+CHAT_COALESCE_ACROSS_PROCESSES = True
+CHAT_COALESCE_WAIT = 120.0
+CHAT_COALESCE_POLL_INTERVAL = 0.1
+
+# Concurrency gate for provider calls (chat/gate.py), per worker process. Keep
+# MAX_IN_FLIGHT + MAX_WAITING below the worker's thread count so chat traffic
+# always leaves threads for the quiz and chapter pages; requests beyond that get
+# a 503 with Retry-After. Requests waiting on an identical call already in
+# flight (chat/singleflight.py) count against MAX_WAITING as well.
+CHAT_GATE_MAX_IN_FLIGHT = 4
+CHAT_GATE_MAX_WAITING = 8
+CHAT_GATE_WAIT_TIMEOUT = 5.0
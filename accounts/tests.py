@@ -1,3 +1,70 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, transaction
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-# Create your tests here.
+from learning.activity import record_activity
+from learning.badges import EVENT_QUIZ, evaluate_awards
+from learning.models import Badge, Chapter, UserChapterCompletion, XPEvent
+from learning.xp import award_xp
+
+
+class DashboardTests(TestCase):
+    # Session, user, profile; everything else comes from caches when warm.
+    WARM_QUERY_BUDGET = 3
+    # ...plus top learners, recent badges, activity, chapter catalog and
+    # unlock state.
+    COLD_QUERY_BUDGET = 8
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="learner", password="pass")
+        cls.first = Chapter.objects.create(title="Chapter 1", content="<p>x</p>", order=1)
+        Badge.objects.create(name="Top Leveler", icon_emoji="⭐")
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        self.url = reverse("accounts:dashboard")
+
+    def test_fixed_query_budget(self):
+        for i in range(5):
+            other = User.objects.create_user(username=f"other{i}", password="pass")
+            award_xp(other, 10 * i, XPEvent.SOURCE_GAME)
+        with self.assertNumQueries(self.COLD_QUERY_BUDGET):
+            self.client.get(self.url)
+        with self.assertNumQueries(self.WARM_QUERY_BUDGET):
+            self.client.get(self.url)
+
+    def test_chapter_lock_state_uses_constant_queries(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(self.url)
+        for i in range(2, 10):
+            Chapter.objects.create(title=f"Chapter {i}", content="<p>x</p>", order=i)
+        UserChapterCompletion.objects.create(user=self.user, chapter=self.first)
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(self.url)
+        self.assertEqual(len(few), len(many))
+        locked = [c["is_locked"] for c in response.context["chapters"]]
+        self.assertEqual(locked[:3], [False, False, True])
+
+    def test_new_badge_invalidates_user_fragment(self):
+        self.assertContains(self.client.get(self.url), "No badges earned yet.")
+        profile = award_xp(self.user, 150, XPEvent.SOURCE_QUIZ)
+        evaluate_awards(self.user, profile, EVENT_QUIZ)
+        response = self.client.get(self.url)
+        self.assertContains(response, "⭐ Top Leveler")
+        self.assertContains(response, "XP: 150")
+
+    def test_activity_fragment_shows_streak(self):
+        self.assertContains(self.client.get(self.url), "Current streak: <strong>0</strong> days")
+        with transaction.atomic():
+            award_xp(self.user, 20, XPEvent.SOURCE_GAME)
+            record_activity(self.user, xp_earned=20)
+        response = self.client.get(self.url)
+        self.assertContains(response, "Current streak: <strong>1</strong> day<")
+        self.assertContains(response, 'class="heat heat-1"', count=1)
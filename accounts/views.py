@@ -4,7 +4,12 @@ from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from .forms import ContactForm
-from learning.models import Chapter, UserAchievement, Achievement, UserProfile
+from learning.models import UserAchievement, Achievement, UserProfile
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+from learning.activity import get_activity_summary
+from learning.chapter_cache import get_chapter_catalog
+from learning.progress import DASHBOARD_FRAGMENT_TIMEOUT, TOP_LEARNERS_TIMEOUT, get_unlock_state
 
 
 # Landing page (HOME)
@@ -90,7 +95,19 @@ def contact_view(request):
 # Dashboard (with profile info)
 @login_required(login_url='accounts:login')
 def dashboard_view(request):
+    """
+    Landing page after login, built on a fixed query budget.
+
+    The top learners and recent badges are passed as lazy querysets and
+    rendered inside cached template fragments, so they only hit the database
+    when their fragment is cold: the shared top learners block expires after
+    a short TTL, the per-user badges and activity blocks are dropped whenever
+    the user's XP, badges or completions change. Chapters come from the
+    cached catalog and unlock state.
+    """
     profile, created = UserProfile.objects.get_or_create(user=request.user)
+    # Share the profile with the header instead of loading it again.
+    request.user.learning_profile = profile
 
     # Calculate level and XP
     level = (profile.xp // 100) + 1
@@ -101,24 +118,29 @@ def dashboard_view(request):
     progress_percent = int((xp / xp_next) * 100)
 
     # Top learners
-    top_learners = UserProfile.objects.order_by('-xp')[:5]
+    top_learners = UserProfile.objects.select_related('user').order_by('-xp')[:5]
 
     # Recent badges
-    recent_badges = UserAchievement.objects.filter(user=request.user).order_by('-earned_at')[:5]
+    recent_badges = (
+        UserAchievement.objects.filter(user=request.user)
+        .select_related('badge', 'achievement')
+        .order_by('-earned_at')[:5]
+    )
+
+    # Streaks and heatmap (built from DailyActivity only on a cold fragment)
+    activity = SimpleLazyObject(lambda: get_activity_summary(request.user))
 
     # Chapters with unlock status
-    from learning.models import UserChapterCompletion
-    chapters_list = Chapter.objects.order_by("order")
-    completed_chapters = UserChapterCompletion.objects.filter(user=request.user).values_list('chapter_id', flat=True)
+    chapters_list = get_chapter_catalog()
+    unlock_state = get_unlock_state(request.user)
     
     chapters = []
     for chapter in chapters_list:
-        is_unlocked = chapter.order == 1 or (chapter.order - 1 <= max((c.order for c in chapters_list.filter(id__in=completed_chapters)), default=0))
         chapters.append({
             'id': chapter.id,
             'title': chapter.title,
-            'image': chapter.image,
-            'is_locked': not is_unlocked,
+            'image_url': chapter.image_url,
+            'is_locked': not unlock_state.is_unlocked(chapter),
             'order': chapter.order
         })
 
@@ -129,7 +151,11 @@ def dashboard_view(request):
         'xp_next': xp_next,
         'progress_percent': progress_percent,
         'top_learners': top_learners,
+        'top_learners_timeout': TOP_LEARNERS_TIMEOUT,
         'recent_badges': recent_badges,
+        'activity': activity,
+        'activity_day': timezone.localdate().isoformat(),
+        'user_fragment_timeout': DASHBOARD_FRAGMENT_TIMEOUT,
         'chapters': chapters,
     }
 
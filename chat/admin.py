@@ -1,8 +1,11 @@
-
 from django.contrib import admin
 
-# Register your models here
-from django.contrib import admin
+from .models import ChatMessage
 
-# Register your models here.
 
+@admin.register(ChatMessage)
+class ChatMessageAdmin(admin.ModelAdmin):
+    list_display = ('user_message', 'timestamp', 'cache_hit')
+    list_filter = ('cache_hit',)
+    search_fields = ('user_message',)
+    readonly_fields = ('cache_key',)
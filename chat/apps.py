@@ -4,10 +4,3 @@ from django.apps import AppConfig
 
 class ChatConfig(AppConfig):
     name = 'chat'
-
-from django.apps import AppConfig
-
-
-class ChatConfig(AppConfig):
-    name = 'chat'
-
@@ -0,0 +1,122 @@
+# chat/gate.py
+"""Bound how many provider calls one worker process makes at a time.
+
+At most ``CHAT_GATE_MAX_IN_FLIGHT`` calls run at once and at most
+``CHAT_GATE_MAX_WAITING`` more wait (up to ``CHAT_GATE_WAIT_TIMEOUT`` seconds)
+for a free slot. Anything beyond that fails fast with LLMBusy, so a burst of
+chat traffic cannot tie up every request thread and stall the learning pages.
+Only real provider calls take a slot; cached replies skip the gate. A request
+waiting for an identical call already in flight (chat/singleflight.py) holds
+a place in the waiting queue for as long as it waits, so those waiters are
+bounded by ``CHAT_GATE_MAX_WAITING`` too.
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from .llm import LLMBusy
+
+# Starting guess for how long a call takes, before any has finished.
+INITIAL_CALL_SECONDS = 3.0
+
+
+class Slot:
+    """A held gate slot; release() is safe to call more than once."""
+
+    def __init__(self, gate, started):
+        self.gate = gate
+        self.started = started
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.gate._release(self.started)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class ConcurrencyGate:
+    def __init__(self, max_in_flight=4, max_waiting=8, wait_timeout=5.0, clock=time.monotonic):
+        self.max_in_flight = max_in_flight
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self.clock = clock
+        self.in_flight = 0
+        self.waiting = 0
+        self.avg_call_seconds = INITIAL_CALL_SECONDS
+        self._condition = threading.Condition()
+
+    def retry_after(self):
+        """Seconds until the calls ahead of a new request have likely drained."""
+        ahead = self.in_flight + self.waiting
+        return max(1, math.ceil(self.avg_call_seconds * ahead / self.max_in_flight))
+
+    def acquire(self):
+        """Return a Slot, waiting in the bounded queue if needed; raises LLMBusy."""
+        with self._condition:
+            if self.in_flight >= self.max_in_flight:
+                if self.waiting >= self.max_waiting:
+                    raise LLMBusy(self.retry_after())
+                self.waiting += 1
+                try:
+                    free = self._condition.wait_for(
+                        lambda: self.in_flight < self.max_in_flight, self.wait_timeout
+                    )
+                finally:
+                    self.waiting -= 1
+                if not free:
+                    raise LLMBusy(self.retry_after())
+            self.in_flight += 1
+        return Slot(self, self.clock())
+
+    @contextmanager
+    def waiting_place(self):
+        """Hold a place in the waiting queue without taking a slot; raises LLMBusy when it is full."""
+        with self._condition:
+            if self.waiting >= self.max_waiting:
+                raise LLMBusy(self.retry_after())
+            self.waiting += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.waiting -= 1
+
+    def _release(self, started):
+        with self._condition:
+            self.in_flight -= 1
+            # Exponentially weighted, so Retry-After follows the provider's pace.
+            self.avg_call_seconds = 0.8 * self.avg_call_seconds + 0.2 * (self.clock() - started)
+            self._condition.notify()
+
+
+_gate = None
+_gate_lock = threading.Lock()
+
+
+def get_gate():
+    """The process-wide gate, built from settings on first use."""
+    global _gate
+    if _gate is None:
+        with _gate_lock:
+            if _gate is None:
+                _gate = ConcurrencyGate(
+                    max_in_flight=getattr(settings, "CHAT_GATE_MAX_IN_FLIGHT", 4),
+                    max_waiting=getattr(settings, "CHAT_GATE_MAX_WAITING", 8),
+                    wait_timeout=getattr(settings, "CHAT_GATE_WAIT_TIMEOUT", 5.0),
+                )
+    return _gate
+
+
+def reset_gate():
+    global _gate
+    with _gate_lock:
+        _gate = None
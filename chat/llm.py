@@ -0,0 +1,270 @@
+# chat/llm.py
+"""LLM client used by the chat assistant.
+
+The backend is chosen with ``CHAT_LLM_BACKEND`` (a dotted path). The Groq
+backend keeps one pooled keep-alive ``requests.Session`` per process, sends
+every request with connect/read timeouts, retries 429/5xx and connection
+errors a bounded number of times with jittered backoff, and sits behind a
+circuit breaker that fails fast while the provider keeps failing. The stub
+backend answers locally, for tests and load tests without network access.
+
+``complete()`` returns the whole reply; ``stream()`` yields it in pieces as
+the provider produces them (server-sent events from Groq).
+"""
+import json
+import random
+import threading
+import time
+
+import requests
+from django.conf import settings
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# Never sleep longer than this between retries, whatever Retry-After says.
+MAX_RETRY_DELAY = 10.0
+
+
+class LLMError(Exception):
+    """The provider did not return a usable completion."""
+
+
+class LLMUnavailable(LLMError):
+    """The circuit breaker is open; the provider is not called at all."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"LLM provider unavailable, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class LLMBusy(LLMError):
+    """Too many provider calls are already running (chat/gate.py)."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"The assistant is busy, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Opens after ``threshold`` consecutive failures for ``cooldown`` seconds.
+
+    Once the cooldown has passed one trial call is let through (half-open); its
+    outcome closes the breaker again or restarts the cooldown.
+    """
+
+    def __init__(self, threshold=5, cooldown=30.0, clock=time.monotonic):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            remaining = self.opened_at + self.cooldown - self.clock()
+            if remaining > 0 or self._trial_running:
+                raise LLMUnavailable(max(remaining, 1.0))
+            self._trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.failures >= self.threshold or self.opened_at is not None:
+                self.opened_at = self.clock()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+
+class BaseBackend:
+    model = ""
+
+    def complete(self, prompt):
+        raise NotImplementedError
+
+    def stream(self, prompt):
+        yield self.complete(prompt)
+
+
+class StubBackend(BaseBackend):
+    """Deterministic local replies; ``CHAT_LLM_STUB_DELAY`` simulates latency."""
+
+    model = "stub"
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+
+    def complete(self, prompt):
+        if self.delay:
+            time.sleep(self.delay)
+        return f"(stub) You asked: {prompt}"
+
+    def stream(self, prompt):
+        words = f"(stub) You asked: {prompt}".split(" ")
+        for i, word in enumerate(words):
+            if self.delay:
+                time.sleep(self.delay / len(words))
+            yield word if i == 0 else " " + word
+
+
+class GroqBackend(BaseBackend):
+    """OpenAI-compatible chat completions at Groq."""
+
+    url = "https://api.groq.com/openai/v1/chat/completions"
+
+    def __init__(self, api_key, model, timeout=(3.05, 30.0), max_retries=2, backoff=0.5,
+                 pool_size=10, breaker=None, session=None, sleep=time.sleep):
+        self.api_key = api_key
+        self.model = model
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.sleep = sleep
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+        self.session = session
+
+    def _headers(self):
+        return {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
+
+    def _delay(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), MAX_RETRY_DELAY)
+            except ValueError:
+                pass
+        # Full jitter: spread retries from many workers instead of syncing them.
+        return random.uniform(0, min(self.backoff * 2 ** attempt, MAX_RETRY_DELAY))
+
+    def post(self, payload, **kwargs):
+        """POST ``payload`` with retries and the breaker; returns the response."""
+        self.breaker.before_call()
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            try:
+                response = self.session.post(
+                    self.url, json=payload, headers=self._headers(), timeout=self.timeout, **kwargs
+                )
+            except requests.ReadTimeout as exc:
+                # Not retried: the provider may still be generating (and
+                # billing) the first request.
+                self.breaker.record_failure()
+                raise LLMError(f"The LLM provider timed out: {exc}") from exc
+            except (requests.ConnectionError, requests.ConnectTimeout) as exc:
+                if last_attempt:
+                    self.breaker.record_failure()
+                    raise LLMError(f"Could not reach the LLM provider: {exc}") from exc
+                self.sleep(self._delay(attempt))
+                continue
+            except requests.RequestException as exc:
+                self.breaker.record_failure()
+                raise LLMError(f"LLM request failed: {exc}") from exc
+
+            if response.status_code in RETRY_STATUSES:
+                if last_attempt:
+                    self.breaker.record_failure()
+                    raise LLMError(f"LLM provider returned HTTP {response.status_code}")
+                self.sleep(self._delay(attempt, response))
+                continue
+            # Anything else means the provider is up, even a 4xx for a bad request.
+            self.breaker.record_success()
+            return response
+
+    def _payload(self, prompt, **extra):
+        return {"model": self.model, "messages": [{"role": "user", "content": prompt}], **extra}
+
+    def _error(self, response):
+        try:
+            error = response.json().get("error", "No response from API")
+        except ValueError:
+            error = f"HTTP {response.status_code}"
+        return LLMError(f"Groq API Error: {error}")
+
+    def complete(self, prompt):
+        response = self.post(self._payload(prompt))
+        try:
+            data = response.json()
+        except ValueError as exc:
+            raise LLMError("LLM provider returned invalid JSON") from exc
+        if data.get("choices"):
+            return data["choices"][0]["message"]["content"]
+        raise self._error(response)
+
+    def stream(self, prompt):
+        """Yield content deltas as they arrive.
+
+        Retries only happen before the first byte; once tokens have been
+        handed out a broken stream raises LLMError instead of starting over.
+        """
+        response = self.post(self._payload(prompt, stream=True), stream=True)
+        with response:
+            if response.status_code != 200:
+                raise self._error(response)
+            try:
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        return
+                    choices = json.loads(data).get("choices") or [{}]
+                    content = choices[0].get("delta", {}).get("content")
+                    if content:
+                        yield content
+            except (requests.RequestException, ValueError) as exc:
+                self.breaker.record_failure()
+                raise LLMError(f"LLM stream interrupted: {exc}") from exc
+
+
+def build_backend():
+    backend_class = import_string(getattr(settings, "CHAT_LLM_BACKEND", "chat.llm.GroqBackend"))
+    if issubclass(backend_class, StubBackend):
+        return backend_class(delay=getattr(settings, "CHAT_LLM_STUB_DELAY", 0.0))
+    return backend_class(
+        api_key=getattr(settings, "CHAT_LLM_API_KEY", ""),
+        model=getattr(settings, "CHAT_LLM_MODEL", "llama-3.1-8b-instant"),
+        timeout=getattr(settings, "CHAT_LLM_TIMEOUT", (3.05, 30.0)),
+        max_retries=getattr(settings, "CHAT_LLM_MAX_RETRIES", 2),
+        pool_size=getattr(settings, "CHAT_LLM_POOL_SIZE", 10),
+        breaker=CircuitBreaker(
+            threshold=getattr(settings, "CHAT_LLM_BREAKER_THRESHOLD", 5),
+            cooldown=getattr(settings, "CHAT_LLM_BREAKER_COOLDOWN", 30.0),
+        ),
+    )
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """The process-wide backend, built from settings on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = build_backend()
+    return _client
+
+
+def reset_client():
+    global _client
+    with _client_lock:
+        _client = None
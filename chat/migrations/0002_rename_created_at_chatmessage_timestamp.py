@@ -17,23 +17,3 @@ class Migration(migrations.Migration):
             new_name='timestamp',
         ),
     ]
-
-# Generated by Django 6.0 on 2025-12-20 09:38
-
-from django.db import migrations
-
-
-class Migration(migrations.Migration):
-
-    dependencies = [
-        ('chat', '0001_initial'),
-    ]
-
-    operations = [
-        migrations.RenameField(
-            model_name='chatmessage',
-            old_name='created_at',
-            new_name='timestamp',
-        ),
-    ]
-
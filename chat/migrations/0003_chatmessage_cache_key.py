@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-18 16:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_rename_created_at_chatmessage_timestamp'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatmessage',
+            name='cache_hit',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='chatmessage',
+            name='cache_key',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
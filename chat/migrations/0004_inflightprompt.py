@@ -0,0 +1,24 @@
+# Generated by Django 4.2 on 2026-10-18 16:14
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_chatmessage_cache_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InflightPrompt',
+            fields=[
+                ('key', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('started_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('done', models.BooleanField(default=False)),
+                ('reply', models.TextField(blank=True)),
+                ('error', models.TextField(blank=True)),
+            ],
+        ),
+    ]
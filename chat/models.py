@@ -1,20 +1,27 @@
 
 from django.db import models
+from django.utils import timezone
 
 class ChatMessage(models.Model):
     user_message = models.TextField()
     bot_response = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
+    # sha256 of model + normalized prompt (chat/response_cache.py); blank for
+    # error replies so they are never served again.
+    cache_key = models.CharField(max_length=64, blank=True, db_index=True)
+    cache_hit = models.BooleanField(default=False)
 
     def __str__(self):
         return f"{self.user_message[:30]}..."
-from django.db import models
 
-class ChatMessage(models.Model):
-    user_message = models.TextField()
-    bot_response = models.TextField()
-    timestamp = models.DateTimeField(auto_now_add=True)
 
-    def __str__(self):
-        return f"{self.user_message[:30]}..."
+class InflightPrompt(models.Model):
+    """A prompt some worker is currently asking the provider (chat/singleflight.py)."""
+    key = models.CharField(max_length=64, primary_key=True)
+    started_at = models.DateTimeField(default=timezone.now, db_index=True)
+    done = models.BooleanField(default=False)
+    reply = models.TextField(blank=True)
+    error = models.TextField(blank=True)
 
+    def __str__(self):
+        return self.key
@@ -0,0 +1,106 @@
+# chat/response_cache.py
+"""Cache of assistant replies keyed by normalized prompt and model.
+
+Replies live in the ``chat`` cache alias (a LocMemCache whose ``TIMEOUT``
+and ``MAX_ENTRIES`` give the TTL and least-recently-used eviction). On a
+miss the newest provider-generated ChatMessage with the same indexed
+``cache_key`` inside the TTL is used instead, so a restarted or different worker still answers a repeated
+question without calling the provider.
+"""
+import hashlib
+import re
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from .models import ChatMessage
+
+CACHE_ALIAS = 'chat'
+
+_SPACES = re.compile(r'\s+')
+
+
+def normalize_prompt(prompt):
+    """Case, spacing and trailing punctuation don't change the question."""
+    return _SPACES.sub(' ', prompt.casefold()).strip().rstrip('?!. ')
+
+
+def prompt_key(prompt, model):
+    return hashlib.sha256(f"{model}\n{normalize_prompt(prompt)}".encode('utf-8')).hexdigest()
+
+
+def enabled():
+    return getattr(settings, 'CHAT_CACHE_ENABLED', True)
+
+
+def ttl():
+    return getattr(settings, 'CHAT_CACHE_TTL', 60 * 60 * 24)
+
+
+class CacheStats:
+    """Hit/miss counters for this process."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def reset(self):
+        with self._lock:
+            self.hits = self.misses = 0
+
+    def snapshot(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+stats = CacheStats()
+
+
+def _cache_key(key):
+    return f"chat:reply:{key}"
+
+
+def lookup(key):
+    """Return the cached reply for ``key``, or None."""
+    if not enabled():
+        return None
+    cache = caches[CACHE_ALIAS]
+    reply = cache.get(_cache_key(key))
+    if reply is None:
+        row = (
+            # Rows saved for cache hits repeat an older answer; counting them
+            # would keep extending its TTL.
+            ChatMessage.objects.filter(
+                cache_key=key, cache_hit=False, timestamp__gte=timezone.now() - timedelta(seconds=ttl()),
+            )
+            .order_by('-timestamp')
+            .values_list('bot_response', 'timestamp')
+            .first()
+        )
+        if row is not None:
+            reply, saved_at = row
+            remaining = ttl() - (timezone.now() - saved_at).total_seconds()
+            cache.set(_cache_key(key), reply, max(int(remaining), 1))
+    stats.record(reply is not None)
+    return reply
+
+
+def store(key, reply):
+    if enabled():
+        caches[CACHE_ALIAS].set(_cache_key(key), reply, ttl())
@@ -0,0 +1,200 @@
+# chat/singleflight.py
+"""Coalesce concurrent identical prompts into one upstream call.
+
+The first request for a cache key becomes the leader and calls the provider;
+identical requests that arrive while it runs wait for its result instead of
+making their own call. Threads of one process wait on a shared Flight. Other
+processes find the leader through an InflightPrompt row: the leader claims the
+key by inserting it (primary key, so only one insert wins) and writes the
+reply or error back to it, which the waiters poll for.
+"""
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .gate import get_gate
+from .llm import LLMBusy, LLMError
+from .models import InflightPrompt
+
+
+def wait_timeout():
+    # Longer than a leader can take: every retry at the full read timeout.
+    return getattr(settings, 'CHAT_COALESCE_WAIT', 120.0)
+
+
+def across_processes():
+    return getattr(settings, 'CHAT_COALESCE_ACROSS_PROCESSES', True)
+
+
+class Flight:
+    """One upstream call in progress in this process."""
+
+    def __init__(self, key):
+        self.key = key
+        self.reply = None
+        self.error = None
+        self.owns_row = False
+        self.finished = False
+        self._done = threading.Event()
+        self._finish_lock = threading.Lock()
+
+    def start_finishing(self):
+        """True for the first caller only, so a flight is finished once."""
+        with self._finish_lock:
+            if self.finished:
+                return False
+            self.finished = True
+            return True
+
+    def publish(self, reply=None, error=None):
+        self.reply = reply
+        self.error = error
+        self._done.set()
+
+    def wait(self):
+        """The leader's reply; raises its LLMError, or LLMBusy when the gate's queue is full."""
+        if not self._done.is_set():
+            # A waiting request ties up a thread like a queued provider call.
+            with get_gate().waiting_place():
+                done = self._done.wait(wait_timeout())
+            if not done:
+                raise LLMError("Timed out waiting for the same question to be answered.")
+        if self.error is not None:
+            raise self.error
+        return self.reply
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def _claim(key):
+    """Try to become the leader for ``key`` across processes."""
+    stale = timezone.now() - timedelta(seconds=wait_timeout())
+    # Finished rows for this key and rows left behind by crashed leaders.
+    InflightPrompt.objects.filter(Q(key=key, done=True) | Q(started_at__lt=stale)).delete()
+    try:
+        with transaction.atomic():
+            InflightPrompt.objects.create(key=key)
+    except IntegrityError:
+        return False
+    return True
+
+
+def _wait_for_row(key, deadline, sleep=time.sleep):
+    """Poll another process's row; returns (done, reply, error)."""
+    interval = getattr(settings, 'CHAT_COALESCE_POLL_INTERVAL', 0.1)
+    while time.monotonic() < deadline:
+        row = InflightPrompt.objects.filter(key=key).values_list('done', 'reply', 'error').first()
+        if row is None:
+            return False, None, None
+        done, reply, error = row
+        if done:
+            return True, reply, LLMError(error) if error else None
+        sleep(interval)
+    return True, None, LLMError("Timed out waiting for the same question to be answered.")
+
+
+def begin(key):
+    """Join or start the flight for ``key``; returns (flight, is_leader).
+
+    A leader must call the provider and then ``finish()``; anyone else calls
+    ``flight.wait()``. When another process holds the key this blocks until
+    that process is done, holding a place in the gate's waiting queue, and
+    raises LLMBusy when the queue is full.
+    """
+    with _flights_lock:
+        flight = _flights.get(key)
+        if flight is not None:
+            return flight, False
+        flight = _flights[key] = Flight(key)
+    if not across_processes():
+        return flight, True
+
+    deadline = time.monotonic() + wait_timeout()
+    while True:
+        if _claim(key):
+            flight.owns_row = True
+            return flight, True
+        try:
+            with get_gate().waiting_place():
+                done, reply, error = _wait_for_row(key, deadline)
+        except LLMBusy as e:
+            if flight.start_finishing():
+                _finish_local(flight, None, e)
+            raise
+        if done:
+            # Answer this process's waiters from the other process's result.
+            _finish_local(flight, reply, error)
+            return flight, False
+        # The row vanished without a result; try to claim it again.
+
+
+def _finish_local(flight, reply, error):
+    with _flights_lock:
+        _flights.pop(flight.key, None)
+    flight.publish(reply, error)
+
+
+def _mark_row_done(key, reply, error):
+    InflightPrompt.objects.filter(key=key).update(
+        done=True, reply=reply or '', error=str(error) if error is not None else '',
+    )
+
+
+def finish(flight, reply=None, error=None):
+    """Hand the leader's reply (or LLMError) to everyone waiting on ``flight``.
+
+    Only the first call for a flight counts; later ones do nothing.
+    """
+    if not flight.start_finishing():
+        return
+    try:
+        if flight.owns_row:
+            _mark_row_done(flight.key, reply, error)
+    finally:
+        _finish_local(flight, reply, error)
+
+
+def abandon(flight):
+    """Finish ``flight`` with an error if its leader never got to.
+
+    Meant for a finalizer on a leader's response that may be dropped before
+    it runs. It may fire on any thread, including an event loop's, so the row
+    update runs on a thread of its own.
+    """
+    if not flight.start_finishing():
+        return
+    error = LLMError("The answer to this question was interrupted.")
+    _finish_local(flight, None, error)
+    if flight.owns_row:
+        threading.Thread(target=_mark_abandoned_row, args=(flight.key, error), daemon=True).start()
+
+
+def _mark_abandoned_row(key, error):
+    try:
+        _mark_row_done(key, None, error)
+    finally:
+        connection.close()
+
+
+def coalesce(key, call):
+    """Return ``call()``, shared with identical calls already in flight."""
+    flight, leader = begin(key)
+    if not leader:
+        return flight.wait()
+    try:
+        reply = call()
+    except LLMError as e:
+        finish(flight, error=e)
+        raise
+    except BaseException:
+        finish(flight, error=LLMError("The assistant failed to answer this question."))
+        raise
+    finish(flight, reply=reply)
+    return reply
@@ -1,9 +1,489 @@
-<<<<<<< HEAD
-from django.test import TestCase
-
-# Create your tests here.
-=======
-from django.test import TestCase
-
-# Create your tests here.
->>>>>>> 3d5c8dafa1c7522f9648891421193305a5191b1e
+import gc
+import json
+import threading
+import time
+from datetime import timedelta
+
+import requests
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import response_cache, singleflight, views
+from .gate import ConcurrencyGate, get_gate, reset_gate
+from .llm import CircuitBreaker, GroqBackend, LLMBusy, LLMError, LLMUnavailable, StubBackend, get_client, reset_client
+from .models import ChatMessage, InflightPrompt
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, data=None, headers=None, lines=()):
+        self.status_code = status_code
+        self.data = data if data is not None else {"choices": [{"message": {"content": "hi"}}]}
+        self.headers = headers or {}
+        self.lines = lines
+        self.closed = False
+
+    def json(self):
+        return self.data
+
+    def iter_lines(self, decode_unicode=False):
+        for line in self.lines:
+            if isinstance(line, Exception):
+                raise line
+            yield line
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.closed = True
+
+
+class FakeSession:
+    """Replays queued responses (or raises queued exceptions) for session.post."""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = []
+
+    def post(self, url, **kwargs):
+        self.calls.append(kwargs)
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def chunk(text):
+    return "data: " + json.dumps({"choices": [{"delta": {"content": text}}]})
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_backend(session, **kwargs):
+    kwargs.setdefault("max_retries", 2)
+    return GroqBackend("key", "model", session=session, sleep=lambda seconds: None, **kwargs)
+
+
+class GroqBackendTests(TestCase):
+    def test_success_uses_timeout_and_session(self):
+        session = FakeSession(FakeResponse())
+        backend = make_backend(session, timeout=(1, 5))
+        self.assertEqual(backend.complete("hello"), "hi")
+        self.assertEqual(session.calls[0]["timeout"], (1, 5))
+        self.assertEqual(session.calls[0]["json"]["messages"][0]["content"], "hello")
+
+    def test_retries_429_and_5xx_then_succeeds(self):
+        delays = []
+        session = FakeSession(
+            FakeResponse(429, headers={"Retry-After": "3"}), FakeResponse(503), FakeResponse()
+        )
+        backend = GroqBackend("key", "model", session=session, max_retries=2, sleep=delays.append)
+        self.assertEqual(backend.complete("hello"), "hi")
+        self.assertEqual(len(session.calls), 3)
+        self.assertEqual(delays[0], 3.0)
+        self.assertLessEqual(delays[1], backend.backoff * 2)
+
+    def test_gives_up_after_max_retries(self):
+        session = FakeSession(FakeResponse(500), FakeResponse(500), FakeResponse(500))
+        with self.assertRaises(LLMError):
+            make_backend(session).complete("hello")
+        self.assertEqual(len(session.calls), 3)
+
+    def test_read_timeout_is_not_retried(self):
+        session = FakeSession(requests.ReadTimeout("slow"), FakeResponse())
+        with self.assertRaises(LLMError):
+            make_backend(session).complete("hello")
+        self.assertEqual(len(session.calls), 1)
+
+    def test_connect_timeout_is_retried(self):
+        session = FakeSession(requests.ConnectTimeout("no route"), FakeResponse())
+        self.assertEqual(make_backend(session).complete("hello"), "hi")
+        self.assertEqual(len(session.calls), 2)
+
+    def test_client_error_is_not_retried_and_keeps_breaker_closed(self):
+        breaker = CircuitBreaker(threshold=1)
+        session = FakeSession(FakeResponse(400, data={"error": "bad request"}))
+        with self.assertRaisesMessage(LLMError, "bad request"):
+            make_backend(session, breaker=breaker).complete("hello")
+        self.assertFalse(breaker.is_open)
+
+    def test_breaker_fails_fast_then_half_opens(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(threshold=2, cooldown=30, clock=clock)
+        session = FakeSession(
+            requests.ConnectionError("down"), requests.ConnectionError("down"), FakeResponse()
+        )
+        backend = make_backend(session, breaker=breaker, max_retries=0)
+        for _ in range(2):
+            with self.assertRaises(LLMError):
+                backend.complete("hello")
+        with self.assertRaises(LLMUnavailable):
+            backend.complete("hello")
+        self.assertEqual(len(session.calls), 2)
+
+        clock.now = 31
+        self.assertEqual(backend.complete("hello"), "hi")
+        self.assertFalse(breaker.is_open)
+
+    def test_stream_yields_deltas(self):
+        response = FakeResponse(lines=[chunk("Hel"), "", ": keep-alive", chunk("lo"), "data: [DONE]"])
+        session = FakeSession(FakeResponse(503), response)
+        tokens = list(make_backend(session).stream("hello"))
+        self.assertEqual(tokens, ["Hel", "lo"])
+        self.assertTrue(session.calls[1]["stream"])
+        self.assertTrue(session.calls[1]["json"]["stream"])
+        self.assertTrue(response.closed)
+
+    def test_broken_stream_is_not_retried(self):
+        session = FakeSession(FakeResponse(lines=[chunk("Hel"), requests.ConnectionError("reset")]))
+        tokens = make_backend(session).stream("hello")
+        self.assertEqual(next(tokens), "Hel")
+        with self.assertRaises(LLMError):
+            next(tokens)
+        self.assertEqual(len(session.calls), 1)
+
+
+@override_settings(CHAT_LLM_BACKEND="chat.llm.StubBackend", CHAT_LLM_STUB_DELAY=0)
+class ChatViewTests(TestCase):
+    def setUp(self):
+        reset_client()
+        self.addCleanup(reset_client)
+        caches[response_cache.CACHE_ALIAS].clear()
+
+    def test_json_post_uses_stub_and_saves_message(self):
+        response = self.client.post(
+            reverse("chat:chat"), json.dumps({"message": "What is a pointer?"}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.json()["response"], StubBackend().complete("What is a pointer?"))
+        message = ChatMessage.objects.get()
+        self.assertEqual(message.user_message, "What is a pointer?")
+
+    async def test_stream_sends_tokens_then_saves_reply(self):
+        response = await self.async_client.post(
+            reverse("chat:chat_stream"), json.dumps({"message": "What is a pointer?"}),
+            content_type="application/json",
+        )
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        body = b"".join([chunk async for chunk in response.streaming_content]).decode()
+        events = [block.split("\n") for block in body.strip().split("\n\n")]
+        tokens = [json.loads(data[6:])["token"] for event, data in events if event == "event: token"]
+        self.assertGreater(len(tokens), 1)
+        self.assertEqual(events[-1][0], "event: done")
+
+        message = await ChatMessage.objects.aget()
+        self.assertEqual(message.bot_response, "".join(tokens))
+        self.assertEqual(message.bot_response, StubBackend().complete("What is a pointer?"))
+        self.assertEqual(json.loads(events[-1][1][6:])["id"], message.id)
+
+    def test_stream_requires_post(self):
+        self.assertEqual(self.client.get(reverse("chat:chat_stream")).status_code, 405)
+
+    def test_empty_message(self):
+        response = self.client.post(reverse("chat:chat"), {"message": "  "})
+        self.assertEqual(response.json()["response"], "Please type a message.")
+        self.assertFalse(ChatMessage.objects.exists())
+
+
+class CountingBackend(StubBackend):
+    calls = 0
+    fail = False
+
+    def complete(self, prompt):
+        CountingBackend.calls += 1
+        if CountingBackend.fail:
+            raise LLMError("down")
+        return super().complete(prompt)
+
+    def stream(self, prompt):
+        CountingBackend.calls += 1
+        return super().stream(prompt)
+
+
+@override_settings(CHAT_LLM_BACKEND="chat.tests.CountingBackend", CHAT_LLM_STUB_DELAY=0)
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        reset_client()
+        self.addCleanup(reset_client)
+        caches[response_cache.CACHE_ALIAS].clear()
+        response_cache.stats.reset()
+        CountingBackend.calls = 0
+        CountingBackend.fail = False
+
+    def ask(self, message, **extra):
+        return self.client.post(
+            reverse("chat:chat"), json.dumps({"message": message, **extra}), content_type="application/json"
+        ).json()
+
+    def test_normalized_prompts_share_a_key(self):
+        self.assertEqual(
+            response_cache.prompt_key("What is a pointer in C++?", "m"),
+            response_cache.prompt_key("  what is a   POINTER in c++ ", "m"),
+        )
+        self.assertNotEqual(
+            response_cache.prompt_key("What is a pointer?", "m"),
+            response_cache.prompt_key("What is a pointer?", "other-model"),
+        )
+
+    def test_repeated_question_is_served_from_cache(self):
+        first = self.ask("What is a pointer in C++?")
+        second = self.ask("what is a pointer in c++")
+        self.assertFalse(first["cached"])
+        self.assertTrue(second["cached"])
+        self.assertEqual(second["response"], first["response"])
+        self.assertEqual(CountingBackend.calls, 1)
+        self.assertEqual(response_cache.stats.snapshot(), {"hits": 1, "misses": 1, "hit_rate": 0.5})
+        self.assertEqual(ChatMessage.objects.filter(cache_hit=True).count(), 1)
+
+    def test_persisted_reply_survives_a_cold_cache_until_ttl(self):
+        self.ask("What is a reference?")
+        caches[response_cache.CACHE_ALIAS].clear()
+        self.assertTrue(self.ask("What is a reference?")["cached"])
+
+        caches[response_cache.CACHE_ALIAS].clear()
+        ChatMessage.objects.update(timestamp=timezone.now() - timedelta(seconds=response_cache.ttl() + 1))
+        self.assertFalse(self.ask("What is a reference?")["cached"])
+        self.assertEqual(CountingBackend.calls, 2)
+
+    def test_cache_hits_do_not_extend_the_ttl(self):
+        self.ask("What is a pointer?")
+        self.assertTrue(self.ask("What is a pointer?")["cached"])
+        ChatMessage.objects.filter(cache_hit=False).update(
+            timestamp=timezone.now() - timedelta(seconds=response_cache.ttl() + 1)
+        )
+        caches[response_cache.CACHE_ALIAS].clear()
+        self.assertFalse(self.ask("What is a pointer?")["cached"])
+        self.assertEqual(CountingBackend.calls, 2)
+
+    def test_fresh_bypasses_cache(self):
+        self.ask("What is a class?")
+        self.assertFalse(self.ask("What is a class?", fresh=True)["cached"])
+        self.assertEqual(CountingBackend.calls, 2)
+
+    def test_errors_are_not_cached(self):
+        CountingBackend.fail = True
+        self.ask("What is a template?")
+        CountingBackend.fail = False
+        self.assertFalse(self.ask("What is a template?")["cached"])
+        self.assertEqual(ChatMessage.objects.filter(cache_key="").count(), 1)
+
+    async def test_stream_uses_cache(self):
+        for _ in range(2):
+            response = await self.async_client.post(
+                reverse("chat:chat_stream"), json.dumps({"message": "What is a vector?"}),
+                content_type="application/json",
+            )
+            body = b"".join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertIn('"cached": true', body)
+        self.assertEqual(CountingBackend.calls, 1)
+
+    def test_stats_are_staff_only(self):
+        url = reverse("chat:cache_stats")
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(User.objects.create_user("staff", password="pw", is_staff=True))
+        self.assertEqual(self.client.get(url).json()["hits"], 0)
+
+
+class SingleFlightTests(TestCase):
+    def run_concurrently(self, call, count=5):
+        """Start a leader, let ``count`` - 1 identical calls join it, then release it."""
+        started, release = threading.Event(), threading.Event()
+        calls, results = [], []
+
+        def upstream():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return call()
+
+        def ask():
+            try:
+                results.append(singleflight.coalesce("key", upstream))
+            except LLMError as e:
+                results.append(e)
+
+        threads = [threading.Thread(target=ask) for _ in range(count)]
+        threads[0].start()
+        started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        time.sleep(0.2)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        return calls, results
+
+    @override_settings(CHAT_COALESCE_ACROSS_PROCESSES=False)
+    def test_concurrent_identical_calls_share_one_upstream_call(self):
+        calls, results = self.run_concurrently(lambda: "answer")
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["answer"] * 5)
+        self.assertEqual(singleflight._flights, {})
+
+    @override_settings(CHAT_COALESCE_ACROSS_PROCESSES=False)
+    def test_waiters_get_the_leaders_error(self):
+        def fail():
+            raise LLMError("down")
+
+        calls, results = self.run_concurrently(fail, count=3)
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(isinstance(result, LLMError) for result in results))
+
+    def test_leader_records_result_on_its_row(self):
+        self.assertEqual(singleflight.coalesce("key", lambda: "answer"), "answer")
+        row = InflightPrompt.objects.get()
+        self.assertEqual((row.key, row.done, row.reply), ("key", True, "answer"))
+        # A finished row does not hold up the next leader.
+        self.assertEqual(singleflight.coalesce("key", lambda: "again"), "again")
+
+    def test_waits_for_another_process(self):
+        InflightPrompt.objects.create(key="key")
+
+        def other_process_finishes(seconds):
+            InflightPrompt.objects.filter(key="key").update(done=True, reply="from elsewhere")
+
+        deadline = time.monotonic() + 5
+        self.assertEqual(
+            singleflight._wait_for_row("key", deadline, sleep=other_process_finishes),
+            (True, "from elsewhere", None),
+        )
+
+    @override_settings(CHAT_COALESCE_WAIT=0.05, CHAT_COALESCE_POLL_INTERVAL=0.01)
+    def test_gives_up_on_a_slow_process(self):
+        InflightPrompt.objects.create(key="key")
+        flight, leader = singleflight.begin("key")
+        self.assertFalse(leader)
+        with self.assertRaisesMessage(LLMError, "Timed out"):
+            flight.wait()
+
+    @override_settings(
+        CHAT_COALESCE_ACROSS_PROCESSES=False, CHAT_COALESCE_WAIT=1,
+        CHAT_LLM_BACKEND="chat.llm.StubBackend", CHAT_LLM_STUB_DELAY=0,
+    )
+    async def test_dropped_leader_stream_releases_the_flight(self):
+        reset_client()
+        reset_gate()
+        self.addCleanup(reset_client)
+        self.addCleanup(reset_gate)
+        caches[response_cache.CACHE_ALIAS].clear()
+        request = AsyncRequestFactory().post(
+            reverse("chat:chat_stream"), json.dumps({"message": "What is a lambda?"}),
+            content_type="application/json",
+        )
+        response = await views.chat_stream(request)
+        self.assertEqual(len(singleflight._flights), 1)
+        del response
+        gc.collect()
+        self.assertEqual(singleflight._flights, {})
+        self.assertEqual(get_gate().in_flight, 0)
+
+        response = await self.async_client.post(
+            reverse("chat:chat_stream"), json.dumps({"message": "What is a lambda?"}),
+            content_type="application/json",
+        )
+        body = b"".join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertIn("event: done", body)
+        self.assertNotIn("Timed out", body)
+
+    def test_finish_is_idempotent(self):
+        flight, leader = singleflight.begin("key")
+        singleflight.finish(flight, reply="answer")
+        singleflight.finish(flight, error=LLMError("late"))
+        singleflight.abandon(flight)
+        self.assertEqual((flight.wait(), InflightPrompt.objects.get().reply), ("answer", "answer"))
+
+    @override_settings(CHAT_COALESCE_WAIT=60)
+    def test_stale_rows_are_taken_over(self):
+        InflightPrompt.objects.create(key="key", started_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(singleflight.coalesce("key", lambda: "answer"), "answer")
+
+
+class ConcurrencyGateTests(TestCase):
+    def test_fails_fast_when_queue_is_full(self):
+        gate = ConcurrencyGate(max_in_flight=1, max_waiting=0)
+        slot = gate.acquire()
+        with self.assertRaises(LLMBusy) as busy:
+            gate.acquire()
+        self.assertGreaterEqual(busy.exception.retry_after, 1)
+        slot.release()
+        slot.release()
+        self.assertEqual(gate.in_flight, 0)
+        with gate.acquire():
+            self.assertEqual(gate.in_flight, 1)
+
+    def test_waiter_gets_the_released_slot(self):
+        gate = ConcurrencyGate(max_in_flight=1, max_waiting=1, wait_timeout=5)
+        slot = gate.acquire()
+        threading.Timer(0.05, slot.release).start()
+        with gate.acquire():
+            self.assertEqual((gate.in_flight, gate.waiting), (1, 0))
+
+    def test_waiter_times_out(self):
+        gate = ConcurrencyGate(max_in_flight=1, max_waiting=1, wait_timeout=0.05)
+        gate.acquire()
+        with self.assertRaises(LLMBusy):
+            gate.acquire()
+        self.assertEqual(gate.waiting, 0)
+
+    def test_waiting_place_counts_against_the_queue(self):
+        gate = ConcurrencyGate(max_in_flight=1, max_waiting=1)
+        with gate.waiting_place():
+            self.assertEqual(gate.waiting, 1)
+            with self.assertRaises(LLMBusy), gate.waiting_place():
+                pass
+        self.assertEqual(gate.waiting, 0)
+
+
+@override_settings(
+    CHAT_LLM_BACKEND="chat.llm.StubBackend", CHAT_LLM_STUB_DELAY=0,
+    CHAT_GATE_MAX_IN_FLIGHT=1, CHAT_GATE_MAX_WAITING=0,
+)
+class ChatBusyTests(TestCase):
+    def setUp(self):
+        reset_client()
+        reset_gate()
+        self.addCleanup(reset_client)
+        self.addCleanup(reset_gate)
+        caches[response_cache.CACHE_ALIAS].clear()
+
+    def post(self, name, message):
+        return self.client.post(
+            reverse(name), json.dumps({"message": message}), content_type="application/json"
+        )
+
+    def test_busy_gate_returns_503_with_retry_after(self):
+        with get_gate().acquire():
+            for name in ("chat:chat", "chat:chat_stream"):
+                response = self.post(name, "What is a lambda?")
+                self.assertEqual(response.status_code, 503)
+                self.assertTrue(response.json()["busy"])
+                self.assertGreaterEqual(int(response["Retry-After"]), 1)
+        self.assertFalse(ChatMessage.objects.exists())
+        self.assertEqual(self.post("chat:chat", "What is a lambda?").status_code, 200)
+
+    def test_followers_of_a_flight_wait_in_the_gate_queue(self):
+        key = response_cache.prompt_key("What is a lambda?", get_client().model)
+        flight = singleflight.Flight(key)
+        singleflight._flights[key] = flight
+        self.addCleanup(singleflight._finish_local, flight, None, None)
+        for name in ("chat:chat", "chat:chat_stream"):
+            response = self.post(name, "What is a lambda?")
+            self.assertEqual(response.status_code, 503)
+            self.assertTrue(response.json()["busy"])
+        self.assertEqual(get_gate().waiting, 0)
+        self.assertFalse(ChatMessage.objects.exists())
+
+    def test_cached_replies_skip_the_gate(self):
+        self.post("chat:chat", "What is a lambda?")
+        with get_gate().acquire():
+            response = self.post("chat:chat", "What is a lambda?")
+        self.assertTrue(response.json()["cached"])
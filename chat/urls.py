@@ -1,16 +1,10 @@
 
 from django.urls import path
-from .views import chat_view
+from .views import cache_stats, chat_stream, chat_view
 app_name = "chat"
 
 urlpatterns = [
     path("", chat_view, name="chat"),
+    path("stream/", chat_stream, name="chat_stream"),
+    path("cache-stats/", cache_stats, name="cache_stats"),
 ]
-
-from django.urls import path
-from .views import chat_view
-
-urlpatterns = [
-    path("", chat_view, name="chat"),
-]
-
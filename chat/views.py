@@ -1,41 +1,80 @@
+import json
+import weakref
 
-import requests
+from asgiref.sync import sync_to_async
+from django.contrib.admin.views.decorators import staff_member_required
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from . import response_cache, singleflight
+from .gate import get_gate
+from .llm import LLMBusy, LLMError, LLMUnavailable, get_client
 from .models import ChatMessage
-from django.views.decorators.csrf import csrf_exempt
-from django.utils.decorators import method_decorator
 
-# Replace with your actual Groq API key
-import os
-GROQ_API_KEY = os.environ.get("GROQ_API_KEY", "")  # Read from environment variable for security
 
-def ask_groq(prompt):
+def ask_groq(prompt, fresh=False):
     """
-    Function to call Groq API with user prompt and return bot response.
+    Ask the configured LLM backend (see chat/llm.py) and return
+    (bot response, cache key, cache hit). Repeated questions are answered from
+    the reply cache unless ``fresh`` is set, and identical questions asked at
+    the same time share one provider call. Provider failures come back as a
+    message for the chat window with a blank cache key, so they are not cached.
+    Raises LLMBusy when the concurrency gate (chat/gate.py) turns the call away.
     """
-    url = "https://api.groq.com/openai/v1/chat/completions"
-    payload = {
-        "model": "llama-3.1-8b-instant",  # you can choose Llama3 variants
-        "messages": [{"role": "user", "content": prompt}]
-    }
-    headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
-        "Content-Type": "application/json"
-    }
+    key = response_cache.prompt_key(prompt, get_client().model)
+    if not fresh:
+        reply = response_cache.lookup(key)
+        if reply is not None:
+            return reply, key, True
+
+    def call():
+        with get_gate().acquire():
+            reply = get_client().complete(prompt)
+        response_cache.store(key, reply)
+        return reply
 
     try:
-        response = requests.post(url, json=payload, headers=headers)
-        data = response.json()
+        reply = singleflight.coalesce(key, call)
+    except LLMBusy:
+        raise
+    except LLMError as e:
+        return error_message(e), "", False
+    return reply, key, False
 
-        # Check if API returned 'choices'
-        if "choices" in data and len(data["choices"]) > 0:
-            return data["choices"][0]["message"]["content"]
-        else:
-            # API error or invalid response
-            return f"Groq API Error: {data.get('error', 'No response from API')}"
-    except Exception as e:
-        return f"Exception calling Groq API: {str(e)}"
+
+def error_message(error):
+    if isinstance(error, LLMUnavailable):
+        return f"The assistant is unavailable right now, please try again in {error.retry_after:.0f} seconds."
+    return f"Exception calling Groq API: {error}"
+
+
+def busy_response(error):
+    response = JsonResponse(
+        {"response": f"The assistant is busy, please try again in {error.retry_after} seconds.", "busy": True},
+        status=503,
+    )
+    response["Retry-After"] = str(error.retry_after)
+    return response
+
+
+def read_message(request):
+    """
+    The user's message from a JSON body (chat.html) or a form post, and
+    whether the reply cache should be bypassed ("fresh": true / fresh=1, or a
+    Cache-Control: no-cache request header).
+    """
+    data = request.POST
+    if request.content_type == "application/json":
+        try:
+            data = json.loads(request.body or b"{}")
+        except ValueError:
+            data = {}
+        if not isinstance(data, dict):
+            data = {}
+    fresh = (
+        str(data.get("fresh", "")).lower() in ("1", "true")
+        or "no-cache" in request.headers.get("Cache-Control", "")
+    )
+    return str(data.get("message", "")).strip(), fresh
 
 
 def chat_view(request):
@@ -43,78 +82,134 @@ def chat_view(request):
     View to handle displaying chat and sending user messages to Groq.
     """
     if request.method == "POST":
-        user_msg = request.POST.get("message", "").strip()
+        user_msg, fresh = read_message(request)
         if not user_msg:
             return JsonResponse({"response": "Please type a message."})
 
-        # Call Groq API
-        bot_reply = ask_groq(user_msg)
+        # Call Groq API (or the reply cache)
+        try:
+            bot_reply, cache_key, cache_hit = ask_groq(user_msg, fresh)
+        except LLMBusy as e:
+            return busy_response(e)
 
         # Save chat in DB
-        ChatMessage.objects.create(user_message=user_msg, bot_response=bot_reply)
+        ChatMessage.objects.create(
+            user_message=user_msg, bot_response=bot_reply, cache_key=cache_key, cache_hit=cache_hit
+        )
 
-        return JsonResponse({"response": bot_reply})
+        return JsonResponse({"response": bot_reply, "cached": cache_hit})
 
     # GET request: display all chats
     chats = ChatMessage.objects.all().order_by("timestamp")
     return render(request, "chat/chat.html", {"messages": chats})
 
-import requests
-from django.shortcuts import render
-from django.http import JsonResponse
-from .models import ChatMessage
-from django.views.decorators.csrf import csrf_exempt
-from django.utils.decorators import method_decorator
 
-# Replace with your actual Groq API key
-GROQ_API_KEY = ""
+# ----------------------------
+# STREAMING (server-sent events)
+# ----------------------------
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
-def ask_groq(prompt):
-    """
-    Function to call Groq API with user prompt and return bot response.
-    """
-    url = "https://api.groq.com/openai/v1/chat/completions"
-    payload = {
-        "model": "llama-3.1-8b-instant",  # you can choose Llama3 variants
-        "messages": [{"role": "user", "content": prompt}]
-    }
-    headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
-        "Content-Type": "application/json"
-    }
 
-    try:
-        response = requests.post(url, json=payload, headers=headers)
-        data = response.json()
+async def send_reply(prompt, reply, key, cache_hit=False, error=False):
+    """A reply that is already complete, sent as a single event."""
+    yield sse("error" if error else "token", {"message" if error else "token": reply})
+    chat = await ChatMessage.objects.acreate(
+        user_message=prompt, bot_response=reply, cache_key=key, cache_hit=cache_hit
+    )
+    yield sse("done", {"id": chat.id, "cached": cache_hit})
+
 
-        # Check if API returned 'choices'
-        if "choices" in data and len(data["choices"]) > 0:
-            return data["choices"][0]["message"]["content"]
+async def stream_as_leader(prompt, flight, slot):
+    """Stream the provider's reply and hand it to the requests waiting on ``flight``."""
+    key = flight.key
+    parts, error, completed = [], None, False
+    try:
+        tokens = get_client().stream(prompt)
+        next_token = sync_to_async(next, thread_sensitive=False)
+        try:
+            while (token := await next_token(tokens, None)) is not None:
+                parts.append(token)
+                yield sse("token", {"token": token})
+            completed = True
+        except LLMError as e:
+            error = e
+        finally:
+            # Releases the upstream connection if the browser went away mid-stream.
+            tokens.close()
+    finally:
+        slot.release()
+        reply = "".join(parts)
+        if completed:
+            await sync_to_async(response_cache.store)(key, reply)
+            await sync_to_async(singleflight.finish)(flight, reply=reply)
         else:
-            # API error or invalid response
-            return f"Groq API Error: {data.get('error', 'No response from API')}"
-    except Exception as e:
-        return f"Exception calling Groq API: {str(e)}"
+            await sync_to_async(singleflight.finish)(
+                flight, error=error or LLMError("The answer to this question was interrupted.")
+            )
 
+    if error is not None:
+        message = error_message(error)
+        reply += ("\n\n" if reply else "") + message
+        key = ""
+        yield sse("error", {"message": message})
+    chat = await ChatMessage.objects.acreate(user_message=prompt, bot_response=reply, cache_key=key)
+    yield sse("done", {"id": chat.id, "cached": False})
 
-def chat_view(request):
+
+async def chat_stream(request):
     """
-    View to handle displaying chat and sending user messages to Groq.
+    POST a message, get the reply back as text/event-stream: "token" events
+    while it is generated, then "done" (or "error"). Streams token by token
+    when served by RoboQuiz.asgi; under WSGI the reply arrives in one piece.
+    A cached reply, or one another request for the same question was already
+    generating, is sent as a single token. When the gate is full (or its
+    waiting queue, for a request that would wait on another one) the answer
+    is a 503 with Retry-After instead of a stream.
     """
-    if request.method == "POST":
-        user_msg = request.POST.get("message", "").strip()
-        if not user_msg:
-            return JsonResponse({"response": "Please type a message."})
-
-        # Call Groq API
-        bot_reply = ask_groq(user_msg)
-
-        # Save chat in DB
-        ChatMessage.objects.create(user_message=user_msg, bot_response=bot_reply)
-
-        return JsonResponse({"response": bot_reply})
-
-    # GET request: display all chats
-    chats = ChatMessage.objects.all().order_by("timestamp")
-    return render(request, "chat/chat.html", {"messages": chats})
-
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+    user_msg, fresh = read_message(request)
+    if not user_msg:
+        return JsonResponse({"response": "Please type a message."}, status=400)
+
+    key = response_cache.prompt_key(user_msg, get_client().model)
+    reply = None if fresh else await sync_to_async(response_cache.lookup)(key)
+    if reply is not None:
+        events = send_reply(user_msg, reply, key, cache_hit=True)
+    else:
+        try:
+            flight, leader = await sync_to_async(singleflight.begin)(key)
+        except LLMBusy as e:
+            return busy_response(e)
+        if leader:
+            try:
+                slot = await sync_to_async(get_gate().acquire)()
+            except LLMBusy as e:
+                await sync_to_async(singleflight.finish)(flight, error=e)
+                return busy_response(e)
+            events = stream_as_leader(user_msg, flight, slot)
+            # Free the slot and the waiters even if the server never starts
+            # the stream (client gone, middleware error, dropped response).
+            weakref.finalize(events, slot.release)
+            weakref.finalize(events, singleflight.abandon, flight)
+        else:
+            try:
+                reply = await sync_to_async(flight.wait)()
+            except LLMBusy as e:
+                return busy_response(e)
+            except LLMError as e:
+                events = send_reply(user_msg, error_message(e), "", error=True)
+            else:
+                events = send_reply(user_msg, reply, key)
+
+    response = StreamingHttpResponse(events, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # don't let nginx buffer the stream
+    return response
+
+
+@staff_member_required
+def cache_stats(request):
+    """Reply cache hit/miss counts for this worker process."""
+    return JsonResponse(response_cache.stats.snapshot())
@@ -0,0 +1,37 @@
+# Generated by Django 4.2 on 2026-10-18 16:40
+
+import uuid
+
+from django.db import migrations, models
+
+import game.models
+
+
+def populate_slugs(apps, schema_editor):
+    Question = apps.get_model('game', 'Question')
+    questions = list(Question.objects.only('id'))
+    for question in questions:
+        question.slug = f"mission-{uuid.uuid4().hex[:12]}"
+    Question.objects.bulk_update(questions, ['slug'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='slug',
+            field=models.SlugField(blank=True, default='', help_text='Stable key for content imports', max_length=100),
+            preserve_default=False,
+        ),
+        migrations.RunPython(populate_slugs, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='question',
+            name='slug',
+            field=models.SlugField(default=game.models.new_mission_slug, help_text='Stable key for content imports', max_length=100, unique=True),
+        ),
+    ]
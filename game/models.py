@@ -1,10 +1,18 @@
+import uuid
+
 from django.db import models
 
+
+def new_mission_slug():
+    return f"mission-{uuid.uuid4().hex[:12]}"
+
+
 class Question(models.Model):
     story = models.TextField(help_text="The mission description for Robo-X")
     code = models.TextField(help_text="The C++ code containing the bug")
     hint = models.TextField(help_text="The hint shown when the user is wrong")
     order = models.IntegerField(default=0, help_text="Order in which mission appears")
+    slug = models.SlugField(max_length=100, unique=True, default=new_mission_slug, help_text="Stable key for content imports")
 
     def __str__(self):
         return f"Mission: {self.story[:30]}..."
@@ -1,6 +1,10 @@
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
+from django.db import transaction
+from learning.activity import record_activity
+from learning.models import XPEvent
+from learning.xp import award_xp
 
 @login_required
 def game_view(request):
@@ -11,8 +15,9 @@ def update_xp(request):
     if request.method == 'POST':
         import json
         data = json.loads(request.body)
-        score = data.get('score', 0)
-        request.user.learning_profile.xp += score
-        request.user.learning_profile.save()
+        score = int(data.get('score', 0))
+        with transaction.atomic():
+            award_xp(request.user, score, XPEvent.SOURCE_GAME)
+            record_activity(request.user, xp_earned=score)
         return JsonResponse({'status': 'success'})
     return JsonResponse({'status': 'error'})
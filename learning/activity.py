@@ -0,0 +1,152 @@
+# learning/activity.py
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import DailyActivity, QuizAttempt, UserChapterCompletion, UserProgressStats, XPEvent
+
+ACTIVITY_FIELDS = ('answers', 'correct', 'xp_earned', 'chapters_completed')
+HEATMAP_DAYS = 365
+# Answers on a day needed for heatmap levels 2, 3 and 4 (any activity is 1).
+HEATMAP_LEVELS = (5, 15, 30)
+
+
+def record_activity(user, **deltas):
+    """Add ``deltas`` to today's DailyActivity row, creating it on the first write of the day.
+
+    Call it inside the same transaction as the write being counted.
+    """
+    unknown = set(deltas) - set(ACTIVITY_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown activity fields: {', '.join(sorted(unknown))}")
+    deltas = {field: amount for field, amount in deltas.items() if amount}
+    if not deltas:
+        return
+    today = timezone.localdate()
+    rows = DailyActivity.objects.filter(user=user, date=today)
+    if rows.update(**{field: F(field) + amount for field, amount in deltas.items()}):
+        return
+    try:
+        with transaction.atomic():
+            DailyActivity.objects.create(user=user, date=today, **deltas)
+    except IntegrityError:
+        # Another request created today's row first.
+        rows.update(**{field: F(field) + amount for field, amount in deltas.items()})
+
+
+class ActivityDay:
+    __slots__ = ('date', 'answers', 'xp_earned', 'level')
+
+    def __init__(self, date, answers=0, xp_earned=0, active=False):
+        self.date = date
+        self.answers = answers
+        self.xp_earned = xp_earned
+        self.level = sum(answers >= threshold for threshold in HEATMAP_LEVELS) + 1 if active else 0
+
+
+class ActivitySummary:
+    """Streaks and the heatmap over the last ``HEATMAP_DAYS`` days.
+
+    ``days`` runs oldest first and ends today. The current streak still counts
+    when today has no activity yet but yesterday did.
+    """
+
+    def __init__(self, days):
+        self.days = days
+        # Heatmap row (1 = Sunday) of the first day, so columns line up with weeks.
+        self.start_row = days[0].date.isoweekday() % 7 + 1 if days else 1
+        active = [day.level > 0 for day in days]
+        self.active_days = sum(active)
+
+        self.longest_streak = run = 0
+        for is_active in active:
+            run = run + 1 if is_active else 0
+            self.longest_streak = max(self.longest_streak, run)
+
+        tail = active[:-1] if active and not active[-1] else active
+        self.current_streak = 0
+        for is_active in reversed(tail):
+            if not is_active:
+                break
+            self.current_streak += 1
+
+
+def get_activity_summary(user, today=None):
+    """Build the user's ActivitySummary with one query on DailyActivity."""
+    today = today or timezone.localdate()
+    start = today - timedelta(days=HEATMAP_DAYS - 1)
+    rows = {
+        date: (answers, xp_earned)
+        for date, answers, xp_earned in DailyActivity.objects.filter(
+            Q(answers__gt=0) | Q(xp_earned__gt=0) | Q(chapters_completed__gt=0),
+            user=user, date__gte=start, date__lte=today,
+        ).values_list('date', 'answers', 'xp_earned')
+    }
+    days = []
+    for offset in range(HEATMAP_DAYS):
+        date = start + timedelta(days=offset)
+        if date in rows:
+            answers, xp_earned = rows[date]
+            days.append(ActivityDay(date, answers, xp_earned, active=True))
+        else:
+            days.append(ActivityDay(date))
+    return ActivitySummary(days)
+
+
+def rebuild_daily_activity(user_ids=None, chunk_size=2000):
+    """Recompute DailyActivity from attempts, the XP ledger and completions.
+
+    The source tables are streamed with ``iterator()`` and folded into one
+    total per (user, day), so memory grows with active user-days rather than
+    with answers. Days whose attempts were archived keep their stored answer
+    counts. Returns the number of rows written.
+    """
+    totals = defaultdict(lambda: dict.fromkeys(ACTIVITY_FIELDS, 0))
+
+    def scoped(queryset):
+        queryset = queryset.order_by()
+        return queryset if user_ids is None else queryset.filter(user_id__in=user_ids)
+
+    archived_before = dict(
+        scoped(UserProgressStats.objects.exclude(attempts_archived_before=None))
+        .values_list('user_id', 'attempts_archived_before')
+    )
+    if archived_before:
+        archived_days = scoped(DailyActivity.objects.filter(user_id__in=archived_before)).values_list(
+            'user_id', 'date', 'answers', 'correct'
+        )
+        for user_id, date, answers, correct in archived_days.iterator(chunk_size=chunk_size):
+            if date < archived_before[user_id]:
+                day = totals[user_id, date]
+                day['answers'] += answers
+                day['correct'] += correct
+
+    attempts = scoped(QuizAttempt.objects.all()).values_list(
+        'user_id', 'submitted_at', 'answered_count', 'correct_count'
+    )
+    for user_id, submitted_at, answered, correct in attempts.iterator(chunk_size=chunk_size):
+        day = totals[user_id, timezone.localdate(submitted_at)]
+        day['answers'] += answered
+        day['correct'] += correct
+
+    # The opening balance is XP from before the ledger, not earned that day.
+    events = scoped(XPEvent.objects.exclude(source=XPEvent.SOURCE_OPENING_BALANCE)).values_list(
+        'user_id', 'created_at', 'amount'
+    )
+    for user_id, created_at, amount in events.iterator(chunk_size=chunk_size):
+        totals[user_id, timezone.localdate(created_at)]['xp_earned'] += amount
+
+    completions = scoped(UserChapterCompletion.objects.all()).values_list('user_id', 'completed_at')
+    for user_id, completed_at in completions.iterator(chunk_size=chunk_size):
+        totals[user_id, timezone.localdate(completed_at)]['chapters_completed'] += 1
+
+    with transaction.atomic():
+        scoped(DailyActivity.objects.all()).delete()
+        DailyActivity.objects.bulk_create(
+            [DailyActivity(user_id=user_id, date=date, **fields) for (user_id, date), fields in totals.items()],
+            batch_size=chunk_size,
+        )
+    return len(totals)
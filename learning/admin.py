@@ -1,7 +1,9 @@
 from django.contrib import admin
 from .models import Chapter, Quiz, Question, UserAnswer
 from django.contrib.admin.sites import AlreadyRegistered
-from .models import Badge, UserProfile, Achievement, UserAchievement
+from .models import Badge, UserProfile, Achievement, UserAchievement, XPEvent, UserProgressStats, QuizAttempt, DailyActivity, QuestionStats
+from .analytics import review_flag
+from .attempts import unpack_answers
 
 
 # Safely register models
@@ -14,8 +16,10 @@ for model in [Chapter, Quiz, Question, UserAnswer]:
 # Badge Admin
 @admin.register(Badge)
 class BadgeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'description', 'image')  # Columns you can see
-    search_fields = ('name',)
+    list_display = ('icon_emoji', 'name', 'slug', 'requirement_label', 'description', 'image')  # Columns you can see
+    list_display_links = ('name',)
+    search_fields = ('name', 'slug')
+    prepopulated_fields = {'slug': ('name',)}
 
 # User Profile Admin
 @admin.register(UserProfile)
@@ -26,9 +30,59 @@ class UserProfileAdmin(admin.ModelAdmin):
 # Optional: Achievements
 @admin.register(Achievement)
 class AchievementAdmin(admin.ModelAdmin):
-    list_display = ('name', 'xp_required', 'chapter')
+    list_display = ('name', 'slug', 'xp_required', 'chapter')
+    prepopulated_fields = {'slug': ('name',)}
 
 # Optional: UserAchievement
 @admin.register(UserAchievement)
 class UserAchievementAdmin(admin.ModelAdmin):
-    list_display = ('user', 'achievement', 'badge', 'earned_at')
\ No newline at end of file
+    list_display = ('user', 'achievement', 'badge', 'earned_at')
+
+# Denormalized progress counters (repair with manage.py rebuild_progress_stats)
+@admin.register(UserProgressStats)
+class UserProgressStatsAdmin(admin.ModelAdmin):
+    list_display = ('user', 'answers_total', 'answers_correct', 'chapters_completed', 'badges_earned', 'last_active_at')
+    search_fields = ('user__username',)
+
+# XP ledger (append-only)
+@admin.register(XPEvent)
+class XPEventAdmin(admin.ModelAdmin):
+    list_display = ('user', 'source', 'amount', 'created_at')
+    list_filter = ('source',)
+    search_fields = ('user__username',)
+
+# Quiz attempts (answers stored packed, see learning/attempts.py)
+@admin.register(QuizAttempt)
+class QuizAttemptAdmin(admin.ModelAdmin):
+    list_display = ('user', 'quiz', 'score_percent', 'correct_count', 'answered_count', 'xp_earned', 'submitted_at')
+    list_filter = ('quiz',)
+    search_fields = ('user__username',)
+    exclude = ('answers',)
+    readonly_fields = ('decoded_answers',)
+
+    @admin.display(description='Answers')
+    def decoded_answers(self, obj):
+        return ", ".join(
+            f"Q{question_id}: {option}{' ✓' if is_correct else ''}"
+            for question_id, option, is_correct in unpack_answers(obj.answers)
+        )
+
+# Per-day activity rollup (rebuild with manage.py backfill_daily_activity)
+@admin.register(DailyActivity)
+class DailyActivityAdmin(admin.ModelAdmin):
+    list_display = ('user', 'date', 'answers', 'correct', 'xp_earned', 'chapters_completed')
+    list_filter = ('date',)
+    search_fields = ('user__username',)
+    date_hierarchy = 'date'
+
+# Item analysis (refresh with manage.py compute_question_stats)
+@admin.register(QuestionStats)
+class QuestionStatsAdmin(admin.ModelAdmin):
+    list_display = ('question', 'answers', 'p_value', 'discrimination', 'option1_count', 'option2_count', 'option3_count', 'option4_count', 'flag', 'computed_at')
+    list_select_related = ('question',)
+    search_fields = ('question__question_text',)
+    ordering = ('p_value',)
+
+    @admin.display(description='Review')
+    def flag(self, obj):
+        return review_flag(obj, obj.question.correct_option)
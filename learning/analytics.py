@@ -0,0 +1,192 @@
+# learning/analytics.py
+"""Question difficulty and discrimination from quiz attempts.
+
+Attempts are streamed in chunks; each chunk's packed answers are decoded
+with one ``numpy.frombuffer`` call and folded into per-question running sums
+with ``numpy.bincount``, so memory is bounded by the chunk size, not by the
+number of answers. Legacy UserAnswer rows are not read: migration 0016
+already folded them into attempts. Attempts moved out by
+``manage.py archive_answers`` leave their sums in the ``archived_*``
+columns of QuestionStats, and every recompute starts from those.
+"""
+import numpy as np
+from django.db.models import F
+from django.utils import timezone
+
+from .attempts import CORRECT_FLAG, OPTION_MASK
+from .models import Question, QuestionStats, QuizAttempt
+
+ANSWER_DTYPE = np.dtype([('question_id', '<u4'), ('packed', 'u1')])
+OPTIONS = 4
+
+# Review thresholds shown in the admin.
+TOO_EASY_P = 0.9
+TOO_HARD_P = 0.3
+LOW_DISCRIMINATION = 0.1
+
+# QuestionStats columns holding archived sums, in ItemSums.columns() order.
+ARCHIVED_FIELDS = (
+    'archived_answers', 'archived_correct', 'archived_rest', 'archived_rest_sq', 'archived_correct_rest',
+    'archived_option1_count', 'archived_option2_count', 'archived_option3_count', 'archived_option4_count',
+)
+
+
+class ItemSums:
+    """Running per-question sums needed for p-values and point-biserial r."""
+
+    def __init__(self, question_ids):
+        self.question_ids = np.asarray(question_ids, dtype=np.int64)
+        size = len(self.question_ids)
+        self.n = np.zeros(size, dtype=np.int64)
+        self.correct = np.zeros(size, dtype=np.int64)
+        # Rest score: correct answers in the same attempt excluding this one.
+        self.rest = np.zeros(size)
+        self.rest_sq = np.zeros(size)
+        self.correct_rest = np.zeros(size)
+        self.options = np.zeros((size, OPTIONS + 1), dtype=np.int64)
+
+    def add(self, blobs, attempt_correct):
+        """Fold one chunk: packed answer blobs and each attempt's correct count."""
+        answers = np.frombuffer(b''.join(blobs), dtype=ANSWER_DTYPE)
+        if not len(answers):
+            return
+        per_attempt = np.fromiter((len(blob) for blob in blobs), dtype=np.int64, count=len(blobs))
+        totals = np.repeat(np.asarray(attempt_correct, dtype=np.float64), per_attempt // ANSWER_DTYPE.itemsize)
+
+        index = np.searchsorted(self.question_ids, answers['question_id'])
+        index = np.minimum(index, len(self.question_ids) - 1)
+        known = self.question_ids[index] == answers['question_id']  # skip deleted questions
+        index, packed, totals = index[known], answers['packed'][known], totals[known]
+
+        item = (packed & CORRECT_FLAG).astype(bool).astype(np.float64)
+        option = np.minimum(packed & OPTION_MASK, OPTIONS)
+        rest = totals - item
+        size = len(self.question_ids)
+
+        self.n += np.bincount(index, minlength=size)
+        self.correct += np.bincount(index, weights=item, minlength=size).astype(np.int64)
+        self.rest += np.bincount(index, weights=rest, minlength=size)
+        self.rest_sq += np.bincount(index, weights=rest * rest, minlength=size)
+        self.correct_rest += np.bincount(index, weights=item * rest, minlength=size)
+        self.options += np.bincount(
+            index * (OPTIONS + 1) + option, minlength=size * (OPTIONS + 1)
+        ).reshape(size, OPTIONS + 1)
+
+    def columns(self):
+        """The per-question sums, in ``ARCHIVED_FIELDS`` order (views, not copies)."""
+        return [
+            self.n, self.correct, self.rest, self.rest_sq, self.correct_rest,
+            *(self.options[:, option] for option in range(1, OPTIONS + 1)),
+        ]
+
+    def seed(self, rows):
+        """Add stored sums: ``rows`` of (question_id, *ARCHIVED_FIELDS values)."""
+        for question_id, *values in rows:
+            i = np.searchsorted(self.question_ids, question_id)
+            if i < len(self.question_ids) and self.question_ids[i] == question_id:
+                for column, value in zip(self.columns(), values):
+                    column[i] += value
+
+    def p_values(self):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(self.n > 0, self.correct / self.n, np.nan)
+
+    def discrimination(self):
+        """Pearson r between the 0/1 item score and the rest score (point-biserial)."""
+        n = self.n.astype(np.float64)
+        covariance = n * self.correct_rest - self.correct * self.rest
+        item_var = n * self.correct - self.correct.astype(np.float64) ** 2
+        rest_var = n * self.rest_sq - self.rest ** 2
+        with np.errstate(divide='ignore', invalid='ignore'):
+            r = covariance / np.sqrt(item_var * rest_var)
+        return np.where((item_var > 0) & (rest_var > 0), r, np.nan)
+
+
+def compute_question_stats(chunk_size=5000):
+    """Recompute QuestionStats for every question; returns the number of rows written."""
+    question_ids = list(Question.objects.order_by('id').values_list('id', flat=True))
+    if not question_ids:
+        return 0
+    sums = ItemSums(question_ids)
+    sums.seed(QuestionStats.objects.filter(archived_answers__gt=0).values_list('question_id', *ARCHIVED_FIELDS))
+
+    blobs, attempt_correct = [], []
+    rows = QuizAttempt.objects.order_by().values_list('answers', 'correct_count').iterator(chunk_size=chunk_size)
+    for answers, correct_count in rows:
+        blobs.append(bytes(answers))
+        attempt_correct.append(correct_count)
+        if len(blobs) >= chunk_size:
+            sums.add(blobs, attempt_correct)
+            blobs, attempt_correct = [], []
+    if blobs:
+        sums.add(blobs, attempt_correct)
+
+    p_values, discrimination = sums.p_values(), sums.discrimination()
+    now = timezone.now()
+    stats = [
+        QuestionStats(
+            question_id=question_id,
+            answers=int(sums.n[i]),
+            correct=int(sums.correct[i]),
+            p_value=None if np.isnan(p_values[i]) else round(float(p_values[i]), 4),
+            discrimination=None if np.isnan(discrimination[i]) else round(float(discrimination[i]), 4),
+            option1_count=int(sums.options[i, 1]),
+            option2_count=int(sums.options[i, 2]),
+            option3_count=int(sums.options[i, 3]),
+            option4_count=int(sums.options[i, 4]),
+            computed_at=now,
+        )
+        for i, question_id in enumerate(question_ids)
+    ]
+    QuestionStats.objects.bulk_create(
+        stats,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['question'],
+        update_fields=[
+            'answers', 'correct', 'p_value', 'discrimination',
+            'option1_count', 'option2_count', 'option3_count', 'option4_count', 'computed_at',
+        ],
+    )
+    return len(stats)
+
+
+def archive_item_sums(attempts):
+    """Add the item sums of ``attempts`` (a QuizAttempt queryset) to the archived columns.
+
+    Call it in the transaction that deletes those attempts, so the next
+    recompute still counts them.
+    """
+    rows = list(attempts.order_by().values_list('answers', 'correct_count'))
+    blobs = [bytes(answers) for answers, _ in rows]
+    answered = np.unique(np.frombuffer(b''.join(blobs), dtype=ANSWER_DTYPE)['question_id']).tolist()
+    question_ids = list(Question.objects.filter(id__in=answered).order_by('id').values_list('id', flat=True))
+    if not question_ids:
+        return
+    sums = ItemSums(question_ids)
+    sums.add(blobs, [correct_count for _, correct_count in rows])
+
+    QuestionStats.objects.bulk_create(
+        [QuestionStats(question_id=question_id) for question_id in question_ids], ignore_conflicts=True
+    )
+    columns = sums.columns()
+    for i, question_id in enumerate(question_ids):
+        QuestionStats.objects.filter(pk=question_id).update(**{
+            field: F(field) + column[i].item() for field, column in zip(ARCHIVED_FIELDS, columns)
+        })
+
+
+def review_flag(stats, correct_option):
+    """Short reason to look at a question, or '' when nothing stands out."""
+    if stats.p_value is None:
+        return ''
+    if stats.p_value >= TOO_EASY_P:
+        return 'too easy'
+    if stats.p_value <= TOO_HARD_P:
+        return 'too hard'
+    counts = [stats.option1_count, stats.option2_count, stats.option3_count, stats.option4_count]
+    if max(count for option, count in enumerate(counts, 1) if option != correct_option) > counts[correct_option - 1]:
+        return 'misleading distractor'
+    if stats.discrimination is not None and stats.discrimination < LOW_DISCRIMINATION:
+        return 'low discrimination'
+    return ''
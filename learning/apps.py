@@ -6,3 +6,7 @@ class LearningConfig(AppConfig):
 
     def ready(self):
         import learning.signals
+        from learning import write_behind
+        if write_behind.enabled():
+            # Starts the flusher, which adopts spools left by exited processes.
+            write_behind.get_buffer()
@@ -0,0 +1,169 @@
+# learning/archive.py
+"""Move old quiz attempts and legacy UserAnswer rows out of the live database.
+
+QuizAttempt is the table that grows with every submit. Before old attempts
+leave, the aggregates built on them (progress counters, daily activity,
+question stats) are refreshed, and each deleted batch adds its sums to the
+per-user and per-question archived totals in the same transaction, so later
+rebuilds and question stats recomputes still count them. UserAnswer is no
+longer written (migration 0016 folded it into QuizAttempt); its remaining
+legacy rows are purged the same way.
+
+Rows are streamed into gzip-compressed JSONL files and deleted in small id
+ranges, each in its own short transaction, so SQLite's writer lock is never
+held for long.
+"""
+import base64
+import gzip
+import json
+import os
+from datetime import datetime, time
+from pathlib import Path
+
+from django.db import connection, transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from .activity import rebuild_daily_activity
+from .analytics import archive_item_sums, compute_question_stats
+from .models import QuizAttempt, UserAnswer, UserProgressStats
+from .stats import rebuild_progress_stats
+
+ARCHIVE_FIELDS = ('id', 'user_id', 'question_id', 'selected_option', 'is_correct', 'answered_at')
+ATTEMPT_ARCHIVE_FIELDS = (
+    'id', 'user_id', 'quiz_id', 'idempotency_key', 'correct_count', 'answered_count', 'total_questions',
+    'score_percent', 'xp_earned', 'duration_seconds', 'answers', 'submitted_at',
+)
+
+
+class ArchiveResult:
+    __slots__ = ('path', 'archived', 'deleted')
+
+    def __init__(self, path=None, archived=0, deleted=0):
+        self.path = path
+        self.archived = archived
+        self.deleted = deleted
+
+
+def refresh_aggregates(user_ids):
+    """Bring every aggregate derived from these users' answers up to date."""
+    rebuild_progress_stats(user_ids=user_ids)
+    rebuild_daily_activity(user_ids=user_ids)
+
+
+def _jsonable(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (bytes, memoryview)):
+        # Packed QuizAttempt answers, see learning/attempts.py.
+        return base64.b64encode(bytes(value)).decode('ascii')
+    return value
+
+
+def write_archive(queryset, path, fields=ARCHIVE_FIELDS, chunk_size=2000, delete_batch_size=500):
+    """Stream ``queryset`` (ordered by id) to ``path`` as gzip JSONL.
+
+    Returns the number of rows written and the inclusive id ranges of at most
+    ``delete_batch_size`` rows each. The file is written under a ``.partial``
+    name and renamed once complete.
+    """
+    partial = path.with_name(path.name + '.partial')
+    ranges, batch_first, batch_rows, last_id, written = [], None, 0, None, 0
+    rows = queryset.order_by('id').values_list(*fields).iterator(chunk_size=chunk_size)
+    with gzip.open(partial, 'wt', encoding='utf-8') as archive:
+        for row in rows:
+            record = {field: _jsonable(value) for field, value in zip(fields, row)}
+            archive.write(json.dumps(record, separators=(',', ':')) + '\n')
+            written += 1
+            last_id = record['id']
+            if batch_first is None:
+                batch_first = last_id
+            batch_rows += 1
+            if batch_rows >= delete_batch_size:
+                ranges.append((batch_first, last_id))
+                batch_first, batch_rows = None, 0
+    if batch_first is not None:
+        ranges.append((batch_first, last_id))
+    with open(partial, 'rb') as archive:
+        os.fsync(archive.fileno())
+    os.replace(partial, path)
+    return written, ranges
+
+
+def _archive_path(archive_dir, prefix, cutoff):
+    archive_dir = Path(archive_dir)
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    stamp = timezone.now().strftime('%Y%m%dT%H%M%S')
+    return archive_dir / f"{prefix}-before-{cutoff:%Y%m%d}-{stamp}.jsonl.gz"
+
+
+def archive_answers(cutoff, archive_dir, chunk_size=2000, delete_batch_size=500, dry_run=False):
+    """Archive and delete legacy UserAnswer rows answered before ``cutoff``."""
+    old_answers = UserAnswer.objects.filter(answered_at__lt=cutoff)
+    user_ids = list(old_answers.order_by().values_list('user_id', flat=True).distinct())
+    if not user_ids:
+        return ArchiveResult()
+    if dry_run:
+        return ArchiveResult(archived=old_answers.count())
+
+    refresh_aggregates(user_ids)
+
+    path = _archive_path(archive_dir, 'useranswer', cutoff)
+    archived, ranges = write_archive(old_answers, path, ARCHIVE_FIELDS, chunk_size, delete_batch_size)
+
+    deleted = 0
+    for first_id, last_id in ranges:
+        with transaction.atomic():
+            count, _ = old_answers.filter(id__gte=first_id, id__lte=last_id).delete()
+        deleted += count
+    return ArchiveResult(path, archived, deleted)
+
+
+def archive_attempts(cutoff, archive_dir, chunk_size=2000, delete_batch_size=500, dry_run=False):
+    """Archive and delete QuizAttempt rows from the local days before ``cutoff``.
+
+    The cutoff is rounded down to local midnight, so a day's activity is
+    either fully archived or not at all.
+    """
+    before = timezone.localdate(cutoff)
+    old_attempts = QuizAttempt.objects.filter(
+        submitted_at__lt=timezone.make_aware(datetime.combine(before, time.min))
+    )
+    user_ids = list(old_attempts.order_by().values_list('user_id', flat=True).distinct())
+    if not user_ids:
+        return ArchiveResult()
+    if dry_run:
+        return ArchiveResult(archived=old_attempts.count())
+
+    refresh_aggregates(user_ids)
+    compute_question_stats()
+    UserProgressStats.objects.filter(pk__in=user_ids).filter(
+        Q(attempts_archived_before=None) | Q(attempts_archived_before__lt=before)
+    ).update(attempts_archived_before=before)
+
+    path = _archive_path(archive_dir, 'quizattempt', before)
+    archived, ranges = write_archive(old_attempts, path, ATTEMPT_ARCHIVE_FIELDS, chunk_size, delete_batch_size)
+
+    deleted = 0
+    for first_id, last_id in ranges:
+        batch = old_attempts.filter(id__gte=first_id, id__lte=last_id)
+        with transaction.atomic():
+            totals = batch.order_by().values('user_id').annotate(
+                answers=Sum('answered_count'), correct=Sum('correct_count')
+            )
+            for row in totals:
+                UserProgressStats.objects.filter(pk=row['user_id']).update(
+                    archived_answers_total=F('archived_answers_total') + row['answers'],
+                    archived_answers_correct=F('archived_answers_correct') + row['correct'],
+                )
+            archive_item_sums(batch)
+            count, _ = batch.delete()
+        deleted += count
+    return ArchiveResult(path, archived, deleted)
+
+
+def vacuum():
+    """Give the space freed by deleted rows back to the filesystem (SQLite only)."""
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('VACUUM')
@@ -0,0 +1,51 @@
+# learning/attempts.py
+"""Packed answer storage for QuizAttempt.
+
+Each answer is five bytes: the question id as a little-endian uint32 followed
+by one byte holding the selected option (1-4) with ``CORRECT_FLAG`` set when
+the answer was right. A 30-question attempt is 150 bytes in one row instead
+of 30 ``UserAnswer`` rows.
+"""
+import struct
+
+ANSWER_STRUCT = struct.Struct("<IB")
+CORRECT_FLAG = 0x80
+OPTION_MASK = 0x7F
+MAX_OPTION = 4
+
+
+def pack_answers(graded):
+    """Pack an iterable of (question_id, selected_option, is_correct)."""
+    return b"".join(
+        ANSWER_STRUCT.pack(question_id, option | (CORRECT_FLAG if is_correct else 0))
+        for question_id, option, is_correct in graded
+    )
+
+
+def unpack_answers(data):
+    """Yield (question_id, selected_option, is_correct) from packed bytes."""
+    for question_id, packed in ANSWER_STRUCT.iter_unpack(bytes(data)):
+        yield question_id, packed & OPTION_MASK, bool(packed & CORRECT_FLAG)
+
+
+def grade(answer_key, selections):
+    """Grade ``selections`` ({question_id: option}) against ``answer_key``.
+
+    Unanswered questions are skipped, and so are selections that are not an
+    option number from 1 to ``MAX_OPTION`` (anything larger would not fit the
+    packed byte or would set ``CORRECT_FLAG``). Returns the graded triples
+    (ready for ``pack_answers``) and the number of correct answers.
+    """
+    graded = []
+    correct_count = 0
+    for question_id, correct_option in answer_key.items():
+        try:
+            selected_option = int(selections.get(question_id) or 0)
+        except (TypeError, ValueError):
+            continue
+        if not 1 <= selected_option <= MAX_OPTION:
+            continue
+        is_correct = selected_option == correct_option
+        correct_count += is_correct
+        graded.append((question_id, selected_option, is_correct))
+    return graded, correct_count
@@ -0,0 +1,152 @@
+# learning/badges.py
+import uuid
+
+from django.core.cache import cache
+from django.utils.functional import cached_property
+
+from .models import Achievement, Badge, UserAchievement, UserProfile
+from .progress import get_unlock_state, invalidate_dashboard
+from .stats import bump_stats
+
+CATALOG_VERSION_KEY = "learning:badges:version"
+
+# (version, BadgeCatalog) for this process; reloaded when the shared version
+# token changes after a staff edit (or the cache is flushed).
+_catalog = None
+
+
+class BadgeCatalog:
+    """Every Badge and Achievement row (with presentation fields), keyed by slug."""
+
+    def __init__(self, badges, achievements):
+        self.badges = {badge.slug: badge for badge in badges}
+        self.achievements = {achievement.slug: achievement for achievement in achievements}
+
+
+def get_catalog():
+    global _catalog
+    version = cache.get_or_set(CATALOG_VERSION_KEY, lambda: uuid.uuid4().hex, None)
+    if _catalog is None or _catalog[0] != version:
+        _catalog = (
+            version,
+            BadgeCatalog(
+                list(Badge.objects.order_by('id')),
+                list(Achievement.objects.order_by('id')),
+            ),
+        )
+    return _catalog[1]
+
+
+def invalidate_catalog():
+    global _catalog
+    _catalog = None
+    cache.set(CATALOG_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+# What triggered an evaluation.
+EVENT_QUIZ = "quiz"  # a graded quiz submission
+EVENT_CHAPTER = "chapter"  # the complete_chapter view
+
+
+class AwardContext:
+    """What just happened to a learner, as seen by the badge rules."""
+
+    def __init__(self, user, profile, event, perfect_quiz=False, completed_chapter=None):
+        self.user = user
+        self.event = event
+        self.xp = profile.xp
+        self.level = profile.level
+        self.perfect_quiz = perfect_quiz
+        self.completed_chapter = completed_chapter
+
+    @cached_property
+    def completed_chapter_ids(self):
+        return get_unlock_state(self.user).completed_ids
+
+
+class BadgeRule:
+    """A badge test and the events it is checked on."""
+
+    def __init__(self, events, test):
+        self.events = frozenset(events)
+        self.test = test
+
+    def applies(self, ctx):
+        return ctx.event in self.events and self.test(ctx)
+
+
+# Badge rules keyed by Badge.slug, each scoped to the events that have always
+# awarded it: quiz badges only on a graded submit (Chapter King still means a
+# perfect quiz), the chapter milestones only on complete_chapter. Badges
+# without a rule are only awarded by hand in the admin.
+BADGE_RULES = {
+    "chapter-king": BadgeRule({EVENT_QUIZ}, lambda ctx: ctx.completed_chapter is not None),
+    "quiz-master": BadgeRule({EVENT_QUIZ}, lambda ctx: ctx.perfect_quiz),
+    "top-leveler": BadgeRule({EVENT_QUIZ}, lambda ctx: ctx.xp >= 100),
+    "supreme-warrior": BadgeRule({EVENT_QUIZ}, lambda ctx: ctx.xp >= 500),
+    "100-xp-badge": BadgeRule({EVENT_CHAPTER}, lambda ctx: ctx.xp >= 100),
+    "level-2-badge": BadgeRule({EVENT_CHAPTER}, lambda ctx: ctx.level >= 2),
+    "first-chapter-completed": BadgeRule({EVENT_CHAPTER}, lambda ctx: (
+        ctx.completed_chapter is not None and ctx.completed_chapter.order == 1
+    )),
+}
+
+
+def achievement_unlocked(achievement, ctx):
+    """Achievements unlock on ``xp_required`` and/or a completed ``chapter``, on any event."""
+    if achievement.xp_required is None and achievement.chapter_id is None:
+        return False
+    if achievement.xp_required is not None and ctx.xp < achievement.xp_required:
+        return False
+    if achievement.chapter_id is not None and achievement.chapter_id not in ctx.completed_chapter_ids:
+        return False
+    return True
+
+
+def grant(user, profile, badges=(), achievements=()):
+    """Write new awards in bulk; rows the user already has are skipped."""
+    awards = [UserAchievement(user=user, badge=badge) for badge in badges]
+    awards += [UserAchievement(user=user, achievement=achievement) for achievement in achievements]
+    if awards:
+        UserAchievement.objects.bulk_create(awards, ignore_conflicts=True)
+    if badges:
+        # Keep the profile's badge list (shown in the admin) in step.
+        through = UserProfile.badges.through
+        through.objects.bulk_create(
+            [through(userprofile_id=profile.id, badge_id=badge.id) for badge in badges],
+            ignore_conflicts=True,
+        )
+    if awards:
+        bump_stats(user, badges_earned=len(badges))
+        invalidate_dashboard(user.id)
+
+
+def evaluate_awards(user, profile, event, perfect_quiz=False, completed_chapter=None):
+    """Evaluate the badge rules for ``event`` and every achievement in one pass.
+
+    Reads the user's earned set with one query and writes with one
+    bulk_create per table plus a counter update. Returns the newly awarded Badge and Achievement
+    rows.
+    """
+    catalog = get_catalog()
+    ctx = AwardContext(user, profile, event, perfect_quiz, completed_chapter)
+
+    earned_badges, earned_achievements = set(), set()
+    for badge_id, achievement_id in UserAchievement.objects.filter(user=user).values_list(
+        "badge_id", "achievement_id"
+    ):
+        if badge_id:
+            earned_badges.add(badge_id)
+        if achievement_id:
+            earned_achievements.add(achievement_id)
+
+    new_badges = [
+        badge for slug, badge in catalog.badges.items()
+        if badge.id not in earned_badges and slug in BADGE_RULES and BADGE_RULES[slug].applies(ctx)
+    ]
+    new_achievements = [
+        achievement for achievement in catalog.achievements.values()
+        if achievement.id not in earned_achievements and achievement_unlocked(achievement, ctx)
+    ]
+    grant(user, profile, new_badges, new_achievements)
+    return new_badges + new_achievements
@@ -0,0 +1,298 @@
+# learning/bulk_grading.py
+"""Grade uploaded answer sheets (paper or offline exams) in one request.
+
+A sheet is CSV with a ``student,quiz,answers`` header or JSONL with the same
+keys. ``student`` is a username, ``quiz`` a quiz id and ``answers`` the
+selected options in question order (the order the quiz page shows), as a
+list or a ``;``/space separated string; ``0`` or an empty slot means
+unanswered.
+
+All rows for a quiz are graded together as one NumPy comparison against the
+cached answer key. Attempts are written with one ``bulk_create``, then every
+student gets one XP award, completions, counter and activity deltas and a
+pass of the badge rules.
+Re-uploading the same file is harmless: each row's idempotency key is derived
+from the file contents and line number.
+"""
+import csv
+import hashlib
+import io
+import json
+from collections import defaultdict
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .activity import record_activity
+from .analytics import ANSWER_DTYPE
+from .attempts import CORRECT_FLAG, MAX_OPTION
+from .badges import EVENT_QUIZ, evaluate_awards
+from .models import Quiz, QuizAttempt, UserChapterCompletion, UserProfile, XPEvent
+from .progress import invalidate_unlock_state
+from .quiz_cache import get_quiz_payload
+from .stats import bump_stats
+from .xp import award_xp
+
+XP_PER_CORRECT = 10
+
+
+class SheetError(ValueError):
+    """The uploaded file cannot be read as an answer sheet."""
+
+
+class SheetRow:
+    __slots__ = ('line', 'student', 'quiz_id', 'answers')
+
+    def __init__(self, line, student, quiz_id, answers):
+        self.line = line
+        self.student = student
+        self.quiz_id = quiz_id
+        self.answers = answers
+
+
+class GradedRow:
+    __slots__ = ('line', 'student', 'quiz', 'correct', 'answered', 'total', 'score', 'xp', 'duplicate')
+
+    def __init__(self, line, student, quiz, correct, answered, total, xp):
+        self.line = line
+        self.student = student
+        self.quiz = quiz
+        self.correct = correct
+        self.answered = answered
+        self.total = total
+        self.score = int(correct / total * 100) if total else 0
+        self.xp = xp
+        self.duplicate = False
+
+
+class BulkGradeResult:
+    def __init__(self):
+        self.rows = []
+        self.errors = []  # (line, message)
+
+    @property
+    def graded(self):
+        return sum(not row.duplicate for row in self.rows)
+
+    @property
+    def duplicates(self):
+        return sum(row.duplicate for row in self.rows)
+
+    @property
+    def students(self):
+        return len({row.student for row in self.rows if not row.duplicate})
+
+
+def _parse_answers(value):
+    if isinstance(value, list):
+        parts = value
+    else:
+        parts = str(value).replace(';', ' ').split()
+    return [int(part or 0) for part in parts]
+
+
+def parse_sheet(data, filename=''):
+    """Return (SheetRow list, [(line, error)]) for CSV or JSONL bytes."""
+    try:
+        text = data.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        raise SheetError("The file is not UTF-8 text.")
+
+    if filename.lower().endswith(('.jsonl', '.json')) or text.lstrip().startswith('{'):
+        records = []
+        for line, raw in enumerate(text.splitlines(), 1):
+            if not raw.strip():
+                continue
+            try:
+                records.append((line, json.loads(raw)))
+            except json.JSONDecodeError:
+                records.append((line, None))
+    else:
+        reader = csv.DictReader(io.StringIO(text))
+        if not reader.fieldnames or not {'student', 'quiz', 'answers'} <= set(reader.fieldnames):
+            raise SheetError("CSV files need a header with student, quiz and answers columns.")
+        records = [(reader.line_num, record) for record in reader]
+
+    rows, errors = [], []
+    for line, record in records:
+        try:
+            rows.append(SheetRow(
+                line,
+                str(record['student']).strip(),
+                int(record['quiz']),
+                _parse_answers(record['answers']),
+            ))
+        except (TypeError, KeyError, ValueError):
+            errors.append((line, "Expected student, quiz and answers."))
+    return rows, errors
+
+
+def grade_matrix(selections, key):
+    """Grade a (students x questions) option matrix against the key row.
+
+    Returns the correct-answer mask and the answered mask, both boolean
+    matrices of the same shape.
+    """
+    answered = selections > 0
+    return (selections == key) & answered, answered
+
+
+def pack_rows(question_ids, selections, correct, answered):
+    """Pack each student's answered questions in the QuizAttempt format."""
+    packed = np.empty(selections.shape, dtype=ANSWER_DTYPE)
+    packed['question_id'] = question_ids
+    packed['packed'] = selections.astype(np.uint8) | np.where(correct, CORRECT_FLAG, 0).astype(np.uint8)
+    return [packed[i][answered[i]].tobytes() for i in range(len(selections))]
+
+
+def grade_sheet(data, filename=''):
+    """Grade every row of an uploaded sheet and apply the results."""
+    rows, errors = parse_sheet(data, filename)
+    result = BulkGradeResult()
+    result.errors.extend(errors)
+    digest = hashlib.sha256(data).hexdigest()[:16]
+
+    users = {user.username: user for user in User.objects.filter(username__in={row.student for row in rows})}
+    quizzes = Quiz.objects.select_related('chapter').in_bulk({row.quiz_id for row in rows})
+
+    by_quiz = defaultdict(list)
+    for row in rows:
+        if row.student not in users:
+            result.errors.append((row.line, f"Unknown student {row.student!r}."))
+        elif row.quiz_id not in quizzes:
+            result.errors.append((row.line, f"Unknown quiz {row.quiz_id}."))
+        else:
+            by_quiz[row.quiz_id].append(row)
+
+    attempts = []
+    for quiz_id, quiz_rows in by_quiz.items():
+        answer_key = get_quiz_payload(quiz_id)["answer_key"]
+        question_ids = np.fromiter(answer_key.keys(), dtype=np.uint32, count=len(answer_key))
+        key = np.fromiter(answer_key.values(), dtype=np.int64, count=len(answer_key))
+
+        valid = []
+        for row in quiz_rows:
+            if len(row.answers) > len(key):
+                result.errors.append((row.line, f"{len(row.answers)} answers for a {len(key)} question quiz."))
+            elif any(option < 0 or option > MAX_OPTION for option in row.answers):
+                result.errors.append((row.line, f"Options must be between 0 and {MAX_OPTION}."))
+            else:
+                valid.append(row)
+        if not valid:
+            continue
+
+        selections = np.zeros((len(valid), len(key)), dtype=np.int64)
+        for i, row in enumerate(valid):
+            selections[i, :len(row.answers)] = row.answers
+        correct, answered = grade_matrix(selections, key)
+        correct_counts = correct.sum(axis=1)
+        answered_counts = answered.sum(axis=1)
+        blobs = pack_rows(question_ids, selections, correct, answered)
+
+        quiz = quizzes[quiz_id]
+        for i, row in enumerate(valid):
+            graded = GradedRow(
+                row.line, row.student, quiz, int(correct_counts[i]), int(answered_counts[i]),
+                len(key), int(correct_counts[i]) * XP_PER_CORRECT,
+            )
+            result.rows.append(graded)
+            attempts.append(QuizAttempt(
+                user=users[row.student],
+                quiz=quiz,
+                idempotency_key=f"sheet-{digest}-{row.line}",
+                correct_count=graded.correct,
+                answered_count=graded.answered,
+                total_questions=graded.total,
+                score_percent=graded.score,
+                xp_earned=graded.xp,
+                answers=blobs[i],
+            ))
+
+    if attempts:
+        _apply(result, attempts)
+    result.errors.sort()
+    return result
+
+
+def _apply(result, attempts):
+    applied = {id(attempt) for attempt in apply_attempts(attempts)}
+    for graded, attempt in zip(result.rows, attempts):
+        graded.duplicate = id(attempt) not in applied
+
+
+def apply_attempts(attempts):
+    """Write new attempts and their XP, completions, counters and awards.
+
+    Attempts need ``user`` and ``quiz.chapter`` loaded. An attempt whose
+    (user, idempotency key) is already stored, or repeated within
+    ``attempts``, is skipped along with everything it would have awarded.
+    The write-behind flusher (learning/write_behind.py) uses this too.
+    Returns the attempts that were written.
+    """
+    seen = set(
+        QuizAttempt.objects.filter(idempotency_key__in=[a.idempotency_key for a in attempts])
+        .values_list('user_id', 'idempotency_key')
+    )
+    new_attempts = []
+    for attempt in attempts:
+        if (attempt.user_id, attempt.idempotency_key) not in seen:
+            seen.add((attempt.user_id, attempt.idempotency_key))
+            new_attempts.append(attempt)
+    if not new_attempts:
+        return []
+
+    per_student = defaultdict(lambda: {'xp': 0, 'answers': 0, 'correct': 0, 'perfect': False, 'chapters': []})
+    for attempt in new_attempts:
+        student = per_student[attempt.user]
+        student['xp'] += attempt.xp_earned
+        student['answers'] += attempt.answered_count
+        student['correct'] += attempt.correct_count
+        if attempt.total_questions and attempt.correct_count == attempt.total_questions:
+            student['perfect'] = True
+            student['chapters'].append(attempt.quiz.chapter)
+
+    user_ids = [user.id for user in per_student]
+    with transaction.atomic():
+        QuizAttempt.objects.bulk_create(new_attempts, batch_size=500)
+
+        completed = set(
+            UserChapterCompletion.objects.filter(user_id__in=user_ids).values_list('user_id', 'chapter_id')
+        )
+        completions = []
+        for user, student in per_student.items():
+            new_chapters = {}
+            for chapter in student['chapters']:
+                if (user.id, chapter.id) not in completed:
+                    new_chapters[chapter.id] = chapter
+            student['chapters'] = list(new_chapters.values())
+            completions += [UserChapterCompletion(user=user, chapter=chapter) for chapter in student['chapters']]
+        UserChapterCompletion.objects.bulk_create(completions, batch_size=500)
+
+        UserProfile.objects.bulk_create([UserProfile(user_id=user_id) for user_id in user_ids], ignore_conflicts=True)
+        profiles = {profile.user_id: profile for profile in UserProfile.objects.filter(user_id__in=user_ids)}
+        for user, student in per_student.items():
+            if student['chapters']:
+                # bulk_create skips the post_save receivers.
+                invalidate_unlock_state(user.id)
+            profile = award_xp(user, student['xp'], XPEvent.SOURCE_QUIZ, profile=profiles[user.id])
+            # Deltas, like submit_quiz, so the upload never rescans a
+            # student's history while holding the write lock.
+            bump_stats(
+                user,
+                answers_total=student['answers'],
+                answers_correct=student['correct'],
+                chapters_completed=len(student['chapters']),
+            )
+            record_activity(
+                user,
+                answers=student['answers'],
+                correct=student['correct'],
+                xp_earned=student['xp'],
+                chapters_completed=len(student['chapters']),
+            )
+            for chapter in student['chapters'] or [None]:
+                evaluate_awards(
+                    user, profile, EVENT_QUIZ, perfect_quiz=student['perfect'], completed_chapter=chapter,
+                )
+    return new_attempts
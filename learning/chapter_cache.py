@@ -0,0 +1,82 @@
+# learning/chapter_cache.py
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.utils.safestring import mark_safe
+
+from .models import Chapter
+from .progress import chapters_version
+
+CHAPTER_HTML_TIMEOUT = 60 * 60 * 24
+CHAPTER_CATALOG_TIMEOUT = 60 * 60 * 24
+
+
+class ChapterSummary:
+    """The columns chapter lists need; never carries ``content``."""
+
+    __slots__ = ("id", "title", "order", "image_url")
+
+    def __init__(self, id, title, order, image_url):
+        self.id = id
+        self.title = title
+        self.order = order
+        self.image_url = image_url
+
+    def __getstate__(self):
+        return (self.id, self.title, self.order, self.image_url)
+
+    def __setstate__(self, state):
+        self.id, self.title, self.order, self.image_url = state
+
+
+def get_chapter_catalog():
+    """Return every chapter as a ChapterSummary, ordered by ``order``.
+
+    Cached under the chapters version, which every Chapter save or delete
+    bumps, so the next read after an edit rebuilds it.
+    """
+    key = f"learning:chapters:catalog:v{chapters_version()}"
+    catalog = cache.get(key)
+    if catalog is None:
+        catalog = [
+            ChapterSummary(id, title, order, default_storage.url(image) if image else "")
+            for id, title, order, image in Chapter.objects.order_by("order").values_list(
+                "id", "title", "order", "image"
+            )
+        ]
+        cache.set(key, catalog, CHAPTER_CATALOG_TIMEOUT)
+    return catalog
+
+
+def get_chapter_html(chapter):
+    """Return the chapter body as safe HTML, cached per content version.
+
+    ``chapter`` only needs ``id`` and ``content_hash`` loaded; the large
+    ``content`` column is read from the database on a cache miss only. A new
+    hash (any content edit) means a new key, so no explicit invalidation is
+    needed.
+    """
+    key = f"learning:chapter:{chapter.id}:html:{chapter.content_hash}"
+    html = cache.get(key)
+    if html is None:
+        html = Chapter.objects.values_list("content", flat=True).get(pk=chapter.id)
+        cache.set(key, html, CHAPTER_HTML_TIMEOUT)
+    return mark_safe(html)
+
+
+def chapter_etag(chapter, request):
+    """Weak ETag for a user's view of a chapter page (body + personal header).
+
+    Besides the chapter version it covers what ``header.html`` renders per
+    session: the CSRF cookie behind the logout form's token (rotated on
+    login) and the profile picture, so a 304 never revives a stale header.
+    """
+    user = request.user
+    profile = getattr(user, 'learning_profile', None)
+    picture = profile.profile_picture.name if profile and profile.profile_picture else ''
+    header = hashlib.sha256(
+        f"{request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')}\n{picture}".encode('utf-8')
+    ).hexdigest()[:16]
+    return f'W/"{chapter.content_hash[:16]}-{int(chapter.updated_at.timestamp())}-{user.id}-{header}"'
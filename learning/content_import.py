@@ -0,0 +1,315 @@
+# learning/content_import.py
+"""Upsert chapters, quizzes, questions and game missions from a content pack.
+
+A pack is JSON or YAML shaped like::
+
+    chapters:
+      - slug: variables
+        title: Variables
+        order: 1
+        content: "<p>...</p>"
+        quizzes:
+          - slug: variables-quiz
+            title: Variables Quiz
+            questions:
+              - slug: variables-q1
+                text: What does int store?
+                options: [Whole numbers, Text, Decimals, Booleans]
+                correct: 1
+    missions:
+      - slug: missing-semicolon
+        story: ...
+        code: ...
+        hint: ...
+        order: 1
+        options:
+          - {text: Add a semicolon, correct: true}
+          - {text: Rename main}
+
+or JSON Lines with one flat record per line (``{"type": "question", "quiz":
+"variables-quiz", ...}``, parents before children), which is read line by
+line. Records are matched on ``slug`` and written in batches with
+``bulk_create(update_conflicts=True)``, one transaction per batch; rows that
+did not change are not written at all.
+"""
+import hashlib
+import json
+from pathlib import Path
+
+from django.db import transaction
+
+from game.models import Option as MissionOption, Question as Mission
+
+from .models import Chapter, Question, Quiz
+from .progress import bump_chapters_version
+from .quiz_cache import invalidate_quiz
+
+try:
+    import yaml
+except ImportError:  # YAML packs are optional
+    yaml = None
+
+IMPORT_BATCH_SIZE = 500
+KINDS = ('chapter', 'quiz', 'question', 'mission')
+
+
+class ContentPackError(ValueError):
+    """The content pack is malformed or refers to unknown parents."""
+
+
+def _chapter(record):
+    content = record.get('content', '')
+    return {
+        'title': record['title'],
+        'order': int(record['order']),
+        'content': content,
+        'content_hash': hashlib.sha256(content.encode('utf-8')).hexdigest(),
+        'is_locked': bool(record.get('is_locked', True)),
+    }
+
+
+def _quiz(record):
+    return {'title': record['title'], 'chapter': record['chapter']}
+
+
+def _question(record):
+    options = record['options']
+    if len(options) != 4:
+        raise ContentPackError(f"question {record['slug']}: expected 4 options, got {len(options)}")
+    correct = int(record['correct'])
+    if not 1 <= correct <= 4:
+        raise ContentPackError(f"question {record['slug']}: correct must be 1-4")
+    fields = {'question_text': record['text'], 'correct_option': correct, 'quiz': record['quiz']}
+    fields.update({f'option{i}': str(option) for i, option in enumerate(options, 1)})
+    return fields
+
+
+def _mission(record):
+    return {
+        'story': record['story'],
+        'code': record.get('code', ''),
+        'hint': record.get('hint', ''),
+        'order': int(record.get('order', 0)),
+        'options': tuple(
+            (str(option['text']), bool(option.get('correct', False))) for option in record.get('options', [])
+        ),
+    }
+
+
+class Spec:
+    def __init__(self, model, parse, fields, parent=None, touch=()):
+        self.model = model
+        self.parse = parse
+        self.fields = fields
+        # (field name, parent model) for a foreign key given as a slug
+        self.parent = parent
+        # auto_now fields to refresh when an existing row is updated
+        self.touch = touch
+
+
+SPECS = {
+    'chapter': Spec(
+        Chapter, _chapter, ('title', 'order', 'content', 'content_hash', 'is_locked'), touch=('updated_at',),
+    ),
+    'quiz': Spec(Quiz, _quiz, ('title', 'chapter_id'), parent=('chapter', Chapter)),
+    'question': Spec(
+        Question, _question,
+        ('question_text', 'option1', 'option2', 'option3', 'option4', 'correct_option', 'quiz_id'),
+        parent=('quiz', Quiz),
+    ),
+    'mission': Spec(Mission, _mission, ('story', 'code', 'hint', 'order')),
+}
+
+
+def read_pack(path):
+    """Yield (kind, record) pairs from a .json, .jsonl, .yaml or .yml pack, parents first."""
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix == '.jsonl':
+        with open(path, encoding='utf-8') as pack:
+            for line_number, line in enumerate(pack, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as exc:
+                    raise ContentPackError(f"line {line_number}: {exc}")
+                kind = record.pop('type', None)
+                if kind not in KINDS:
+                    raise ContentPackError(f"line {line_number}: type must be one of {', '.join(KINDS)}")
+                yield kind, record
+        return
+
+    with open(path, encoding='utf-8') as pack:
+        if suffix in ('.yaml', '.yml'):
+            if yaml is None:
+                raise ContentPackError("Install PyYAML to import YAML content packs.")
+            document = yaml.safe_load(pack)
+        else:
+            try:
+                document = json.load(pack)
+            except json.JSONDecodeError as exc:
+                raise ContentPackError(str(exc))
+    if not isinstance(document, dict):
+        raise ContentPackError("A content pack must be a mapping with chapters and/or missions.")
+
+    for chapter in document.get('chapters') or []:
+        quizzes = chapter.pop('quizzes', None) or []
+        yield 'chapter', chapter
+        for quiz in quizzes:
+            questions = quiz.pop('questions', None) or []
+            quiz.setdefault('chapter', chapter.get('slug'))
+            yield 'quiz', quiz
+            for question in questions:
+                question.setdefault('quiz', quiz.get('slug'))
+                yield 'question', question
+    for mission in document.get('missions') or []:
+        yield 'mission', mission
+
+
+class ImportReport:
+    def __init__(self):
+        self.counts = {kind: {'created': 0, 'updated': 0, 'unchanged': 0} for kind in KINDS}
+        self.changes = []  # (action, kind, slug)
+
+    def add(self, kind, action, slug):
+        self.counts[kind][action] += 1
+        if action != 'unchanged':
+            self.changes.append((action, kind, slug))
+
+
+class ContentImporter:
+    """Collects records into per-kind batches and upserts them."""
+
+    def __init__(self, batch_size=IMPORT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.report = ImportReport()
+        self.pending = {kind: {} for kind in KINDS}
+        self.changed_chapters = False
+        self.changed_quiz_ids = set()
+
+    def add(self, kind, record):
+        try:
+            slug = record['slug']
+            fields = SPECS[kind].parse(record)
+        except (KeyError, TypeError, ValueError) as exc:
+            if isinstance(exc, ContentPackError):
+                raise
+            raise ContentPackError(f"{kind} {record.get('slug', '?')}: missing or invalid {exc}")
+        self.pending[kind][slug] = fields
+        if sum(len(batch) for batch in self.pending.values()) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not any(self.pending.values()):
+            return
+        with transaction.atomic():
+            for kind in KINDS:
+                batch, self.pending[kind] = self.pending[kind], {}
+                if batch:
+                    self._upsert(kind, batch)
+        # bulk_create skips the post_save receivers that normally do this.
+        if self.changed_chapters:
+            bump_chapters_version()
+            self.changed_chapters = False
+        for quiz_id in self.changed_quiz_ids:
+            invalidate_quiz(quiz_id)
+        self.changed_quiz_ids.clear()
+
+    def finish(self):
+        self.flush()
+        return self.report
+
+    def _upsert(self, kind, batch):
+        spec = SPECS[kind]
+        model = spec.model
+        if spec.parent:
+            name, parent_model = spec.parent
+            parent_ids = dict(
+                parent_model.objects.filter(slug__in={fields[name] for fields in batch.values()})
+                .values_list('slug', 'id')
+            )
+            for slug, fields in batch.items():
+                parent_slug = fields.pop(name)
+                if parent_slug not in parent_ids:
+                    raise ContentPackError(f"{kind} {slug}: unknown {name} {parent_slug!r}")
+                fields[f'{name}_id'] = parent_ids[parent_slug]
+
+        existing = {
+            row['slug']: row
+            for row in model.objects.filter(slug__in=batch.keys()).values('slug', 'id', *spec.fields)
+        }
+        if kind == 'mission':
+            options = {}
+            for slug, text, is_correct in (
+                MissionOption.objects.filter(question__slug__in=existing.keys())
+                .order_by('id').values_list('question__slug', 'text', 'is_correct')
+            ):
+                options.setdefault(slug, []).append((text, is_correct))
+            for slug, row in existing.items():
+                row['options'] = tuple(options.get(slug, ()))
+
+        rows, changed_slugs = [], []
+        for slug, fields in batch.items():
+            current = existing.get(slug)
+            if current is None:
+                action = 'created'
+            elif any(current[field] != value for field, value in fields.items()):
+                action = 'updated'
+            else:
+                action = 'unchanged'
+            self.report.add(kind, action, slug)
+            if action == 'unchanged':
+                continue
+            changed_slugs.append(slug)
+            rows.append(model(slug=slug, **{field: fields[field] for field in spec.fields}))
+            if kind == 'quiz' and current:
+                self.changed_quiz_ids.add(current['id'])
+            if kind == 'question':
+                self.changed_quiz_ids.add(fields['quiz_id'])
+                if current:
+                    self.changed_quiz_ids.add(current['quiz_id'])
+        if not rows:
+            return
+
+        model.objects.bulk_create(
+            rows, batch_size=self.batch_size,
+            update_conflicts=True, unique_fields=['slug'], update_fields=[*spec.fields, *spec.touch],
+        )
+        if kind == 'chapter':
+            self.changed_chapters = True
+        if kind == 'mission':
+            self._replace_mission_options({slug: batch[slug]['options'] for slug in changed_slugs})
+
+    def _replace_mission_options(self, options_by_slug):
+        # Options have no stable key of their own; a changed mission gets its
+        # list rewritten.
+        ids = dict(Mission.objects.filter(slug__in=options_by_slug.keys()).values_list('slug', 'id'))
+        MissionOption.objects.filter(question_id__in=ids.values()).delete()
+        MissionOption.objects.bulk_create(
+            [
+                MissionOption(question_id=ids[slug], text=text, is_correct=is_correct)
+                for slug, options in options_by_slug.items()
+                for text, is_correct in options
+            ],
+            batch_size=self.batch_size,
+        )
+
+
+def import_content(path, batch_size=IMPORT_BATCH_SIZE, dry_run=False):
+    """Import a content pack and return its ImportReport.
+
+    With ``dry_run`` everything is written inside one transaction that is
+    rolled back, so the report shows what would change.
+    """
+    importer = ContentImporter(batch_size)
+    if dry_run:
+        with transaction.atomic():
+            for kind, record in read_pack(path):
+                importer.add(kind, record)
+            importer.flush()
+            transaction.set_rollback(True)
+        return importer.report
+    for kind, record in read_pack(path):
+        importer.add(kind, record)
+    return importer.finish()
@@ -0,0 +1,99 @@
+# learning/exports.py
+"""Row generators and encoders for the streaming progress exports.
+
+Every dataset is a generator over ``.iterator(chunk_size=...)`` querysets with
+the related rows joined in, so an export holds one chunk in memory no matter
+how many learners or attempts there are.
+"""
+import csv
+import json
+
+from .attempts import unpack_answers
+from .models import QuizAttempt, UserProfile
+
+EXPORT_CHUNK_SIZE = 2000
+
+LEARNER_FIELDS = (
+    'username', 'email', 'xp', 'level', 'chapters_completed', 'badges_earned',
+    'answers_total', 'answers_correct', 'last_active_at',
+)
+ANSWER_FIELDS = (
+    'username', 'attempt_id', 'quiz_id', 'quiz', 'submitted_at', 'score_percent',
+    'question_id', 'selected_option', 'is_correct',
+)
+
+
+def learner_rows(chunk_size=EXPORT_CHUNK_SIZE):
+    """One row per learner: XP, level and the progress counters."""
+    profiles = (
+        UserProfile.objects.select_related('user', 'user__progress_stats')
+        .order_by('id')
+        .iterator(chunk_size=chunk_size)
+    )
+    for profile in profiles:
+        user = profile.user
+        stats = getattr(user, 'progress_stats', None)
+        yield {
+            'username': user.username,
+            'email': user.email,
+            'xp': profile.xp,
+            'level': profile.level,
+            'chapters_completed': stats.chapters_completed if stats else 0,
+            'badges_earned': stats.badges_earned if stats else 0,
+            'answers_total': stats.answers_total if stats else 0,
+            'answers_correct': stats.answers_correct if stats else 0,
+            'last_active_at': stats.last_active_at.isoformat() if stats and stats.last_active_at else '',
+        }
+
+
+def answer_rows(chunk_size=EXPORT_CHUNK_SIZE):
+    """One row per answered question, unpacked from each quiz attempt."""
+    attempts = (
+        QuizAttempt.objects.select_related('user', 'quiz')
+        .order_by('id')
+        .iterator(chunk_size=chunk_size)
+    )
+    for attempt in attempts:
+        for question_id, option, is_correct in unpack_answers(attempt.answers):
+            yield {
+                'username': attempt.user.username,
+                'attempt_id': attempt.id,
+                'quiz_id': attempt.quiz_id,
+                'quiz': attempt.quiz.title,
+                'submitted_at': attempt.submitted_at.isoformat(),
+                'score_percent': attempt.score_percent,
+                'question_id': question_id,
+                'selected_option': option,
+                'is_correct': is_correct,
+            }
+
+
+DATASETS = {
+    'learners': (LEARNER_FIELDS, learner_rows),
+    'answers': (ANSWER_FIELDS, answer_rows),
+}
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to csv.writer's caller."""
+
+    def write(self, value):
+        return value
+
+
+def encode_csv(fields, rows):
+    writer = csv.DictWriter(_Echo(), fieldnames=fields)
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def encode_jsonl(fields, rows):
+    for row in rows:
+        yield json.dumps(row, separators=(',', ':')) + '\n'
+
+
+FORMATS = {
+    'csv': ('text/csv', encode_csv),
+    'jsonl': ('application/x-ndjson', encode_jsonl),
+}
@@ -0,0 +1,49 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from learning.archive import archive_answers, archive_attempts, vacuum
+
+
+class Command(BaseCommand):
+    help = "Archive quiz attempts and legacy UserAnswer rows older than the retention period to gzip JSONL files."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than-days", type=int,
+                            default=getattr(settings, "LEARNING_ANSWER_RETENTION_DAYS", 180))
+        parser.add_argument("--archive-dir",
+                            default=getattr(settings, "LEARNING_ARCHIVE_DIR", settings.BASE_DIR / "var" / "archive"))
+        parser.add_argument("--chunk-size", type=int, default=2000)
+        parser.add_argument("--delete-batch-size", type=int, default=500)
+        parser.add_argument("--vacuum", action="store_true",
+                            help="Run VACUUM afterwards to shrink the SQLite file.")
+        parser.add_argument("--dry-run", action="store_true", help="Only count the rows that would be archived.")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options["older_than_days"])
+        results = [
+            (noun, archive(
+                cutoff,
+                options["archive_dir"],
+                chunk_size=options["chunk_size"],
+                delete_batch_size=options["delete_batch_size"],
+                dry_run=options["dry_run"],
+            ))
+            for noun, archive in (("quiz attempt(s)", archive_attempts), ("answer(s)", archive_answers))
+        ]
+        if options["dry_run"]:
+            for noun, result in results:
+                self.stdout.write(f"{result.archived} {noun} older than {cutoff:%Y-%m-%d} would be archived.")
+            return
+        if not any(result.archived for _, result in results):
+            self.stdout.write("Nothing to archive.")
+            return
+        if options["vacuum"]:
+            vacuum()
+        for noun, result in results:
+            if result.archived:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Archived {result.archived} {noun} to {result.path} and deleted {result.deleted}."
+                ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from learning.activity import rebuild_daily_activity
+
+
+class Command(BaseCommand):
+    help = "Rebuild DailyActivity from quiz attempts, the XP ledger and chapter completions."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=2000)
+        parser.add_argument("--user", type=int, action="append", dest="user_ids",
+                            help="Only rebuild this user id (repeatable).")
+
+    def handle(self, *args, **options):
+        written = rebuild_daily_activity(user_ids=options["user_ids"], chunk_size=options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} daily activity row(s)."))
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from learning.analytics import compute_question_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute difficulty, discrimination and distractor counts for every question."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=5000,
+                            help="Attempts decoded per vectorized pass.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        written = compute_question_stats(chunk_size=options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Computed stats for {written} question(s) in {time.monotonic() - started:.1f}s."
+        ))
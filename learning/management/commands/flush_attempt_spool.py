@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from learning.write_behind import AttemptBuffer, fcntl, spool_path
+
+
+class Command(BaseCommand):
+    help = "Insert quiz attempts left in the write-behind spools of processes that have exited."
+
+    def handle(self, *args, **options):
+        if fcntl is None:
+            self.stdout.write(self.style.WARNING(
+                "No file locks on this platform: run this only while the web server is stopped."
+            ))
+        buffer = AttemptBuffer(spool_path(), interval=0)
+        try:
+            written = buffer.replay()
+        finally:
+            buffer.close()
+        self.stdout.write(self.style.SUCCESS(f"Flushed {written} spooled attempt(s)."))
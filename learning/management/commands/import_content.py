@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from learning.content_import import IMPORT_BATCH_SIZE, ContentPackError, import_content
+
+
+class Command(BaseCommand):
+    help = "Create or update chapters, quizzes, questions and game missions from a JSON/JSONL/YAML content pack."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument("--dry-run", action="store_true", help="Report the changes without saving them.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        try:
+            report = import_content(options["path"], batch_size=options["batch_size"], dry_run=options["dry_run"])
+        except (ContentPackError, OSError) as exc:
+            raise CommandError(str(exc))
+
+        if options["verbosity"] > 1:
+            for action, kind, slug in report.changes:
+                self.stdout.write(f"{'+' if action == 'created' else '~'} {kind} {slug}")
+        for kind, counts in report.counts.items():
+            if any(counts.values()):
+                self.stdout.write(
+                    f"{kind}: {counts['created']} created, {counts['updated']} updated, {counts['unchanged']} unchanged"
+                )
+        verb = "Checked" if options["dry_run"] else "Imported"
+        self.stdout.write(self.style.SUCCESS(f"{verb} content pack in {time.monotonic() - started:.1f}s."))
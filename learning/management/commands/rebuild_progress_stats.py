@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from learning.stats import rebuild_progress_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute every UserProgressStats row from answers, completions and awards."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--user", type=int, action="append", dest="user_ids",
+                            help="Only rebuild this user id (repeatable).")
+
+    def handle(self, *args, **options):
+        written = rebuild_progress_stats(user_ids=options["user_ids"], batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt progress stats for {written} user(s)."))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from learning.xp import reconcile_xp
+
+
+class Command(BaseCommand):
+    help = "Rebuild UserProfile XP totals and levels from the XPEvent ledger."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report how many profiles disagree with the ledger.",
+        )
+
+    def handle(self, *args, **options):
+        drifted = reconcile_xp(dry_run=options["dry_run"])
+        if options["dry_run"]:
+            self.stdout.write(f"{drifted} profile(s) disagree with the XP ledger.")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Reconciled {drifted} profile(s) from the XP ledger."))
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 15:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('learning', '0009_userchaptercompletion'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userprofile',
+            name='xp',
+            field=models.IntegerField(db_index=True, default=0),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2 on 2026-10-18 15:47
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def seed_opening_balances(apps, schema_editor):
+    # Existing XP predates the ledger; record it so reconcile_xp keeps it.
+    UserProfile = apps.get_model('learning', 'UserProfile')
+    XPEvent = apps.get_model('learning', 'XPEvent')
+    XPEvent.objects.bulk_create(
+        [
+            XPEvent(user_id=user_id, source='opening_balance', amount=xp)
+            for user_id, xp in UserProfile.objects.exclude(xp=0).values_list('user_id', 'xp').iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('learning', '0010_userprofile_xp_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='XPEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('quiz', 'Quiz'), ('chapter', 'Chapter'), ('game', 'Game'), ('opening_balance', 'Opening balance')], max_length=20)),
+                ('amount', models.IntegerField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='xp_events', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(seed_opening_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 4.2 on 2026-10-18 15:48
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+from django.utils.text import slugify
+
+
+def populate_slugs(apps, schema_editor):
+    for model_name in ('Badge', 'Achievement'):
+        model = apps.get_model('learning', model_name)
+        seen = set()
+        for obj in model.objects.order_by('id'):
+            slug = slugify(obj.name) or str(obj.id)
+            if slug in seen:
+                slug = f"{slug}-{obj.id}"
+            seen.add(slug)
+            obj.slug = slug
+            obj.save(update_fields=['slug'])
+
+
+def drop_duplicate_awards(apps, schema_editor):
+    # Keep the earliest row for every (user, badge) and (user, achievement).
+    UserAchievement = apps.get_model('learning', 'UserAchievement')
+    for field in ('badge', 'achievement'):
+        duplicates = (
+            UserAchievement.objects.filter(**{f'{field}__isnull': False})
+            .values('user', field)
+            .annotate(first_id=Min('id'), rows=Count('id'))
+            .filter(rows__gt=1)
+        )
+        for row in duplicates:
+            UserAchievement.objects.filter(user=row['user'], **{field: row[field]}).exclude(
+                id=row['first_id']
+            ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('learning', '0011_xpevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='achievement',
+            name='slug',
+            field=models.SlugField(blank=True, max_length=110, default=''),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='badge',
+            name='slug',
+            field=models.SlugField(blank=True, max_length=60, default=''),
+            preserve_default=False,
+        ),
+        migrations.RunPython(populate_slugs, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='achievement',
+            name='slug',
+            field=models.SlugField(blank=True, max_length=110, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='badge',
+            name='slug',
+            field=models.SlugField(blank=True, max_length=60, unique=True),
+        ),
+        migrations.RunPython(drop_duplicate_awards, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='userachievement',
+            constraint=models.UniqueConstraint(condition=models.Q(('badge__isnull', False)), fields=('user', 'badge'), name='unique_user_badge'),
+        ),
+        migrations.AddConstraint(
+            model_name='userachievement',
+            constraint=models.UniqueConstraint(condition=models.Q(('achievement__isnull', False)), fields=('user', 'achievement'), name='unique_user_achievement'),
+        ),
+    ]
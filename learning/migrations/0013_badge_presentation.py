@@ -0,0 +1,45 @@
+# Generated by Django 4.2 on 2026-10-18 15:49
+
+from django.db import migrations, models
+
+
+# The achievements page used to derive these from the badge name on every
+# request; store the same values once.
+PRESENTATION_BY_NAME = [
+    ('Supreme', '👑', 'All Chapters'),
+    ('Quiz', '🧠', 'Perfect Quiz'),
+    ('Chapter', '📖', 'Complete Chapter'),
+    ('Level', '⭐', 'Reach Level'),
+]
+
+
+def fill_presentation(apps, schema_editor):
+    Badge = apps.get_model('learning', 'Badge')
+    for badge in Badge.objects.all():
+        for fragment, emoji, label in PRESENTATION_BY_NAME:
+            if fragment in badge.name:
+                badge.icon_emoji = emoji
+                badge.requirement_label = label
+                badge.save(update_fields=['icon_emoji', 'requirement_label'])
+                break
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('learning', '0012_badge_slugs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='badge',
+            name='icon_emoji',
+            field=models.CharField(default='🏆', max_length=8),
+        ),
+        migrations.AddField(
+            model_name='badge',
+            name='requirement_label',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.RunPython(fill_presentation, migrations.RunPython.noop),
+    ]
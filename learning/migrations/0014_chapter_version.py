@@ -0,0 +1,34 @@
+# Generated by Django 4.2 on 2026-10-18 15:50
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def fill_content_hash(apps, schema_editor):
+    Chapter = apps.get_model('learning', 'Chapter')
+    for chapter in Chapter.objects.only('id', 'content'):
+        Chapter.objects.filter(pk=chapter.pk).update(
+            content_hash=hashlib.sha256(chapter.content.encode('utf-8')).hexdigest()
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('learning', '0013_badge_presentation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chapter',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='chapter',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(fill_content_hash, migrations.RunPython.noop),
+    ]
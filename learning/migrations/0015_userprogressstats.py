@@ -0,0 +1,62 @@
+# Generated by Django 4.2 on 2026-10-18 15:52
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max
+import django.db.models.deletion
+
+
+def backfill_stats(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    UserAnswer = apps.get_model('learning', 'UserAnswer')
+    UserChapterCompletion = apps.get_model('learning', 'UserChapterCompletion')
+    UserAchievement = apps.get_model('learning', 'UserAchievement')
+    UserProgressStats = apps.get_model('learning', 'UserProgressStats')
+
+    def per_user(queryset, **aggregates):
+        return {row.pop('user'): row for row in queryset.order_by().values('user').annotate(**aggregates)}
+
+    answers = per_user(UserAnswer.objects.all(), total=Count('id'), last=Max('answered_at'))
+    correct = per_user(UserAnswer.objects.filter(is_correct=True), total=Count('id'))
+    chapters = per_user(UserChapterCompletion.objects.all(), total=Count('id'), last=Max('completed_at'))
+    badges = per_user(UserAchievement.objects.filter(badge__isnull=False), total=Count('id'), last=Max('earned_at'))
+
+    rows = []
+    for user_id in User.objects.values_list('id', flat=True).iterator():
+        sources = [answers.get(user_id), chapters.get(user_id), badges.get(user_id)]
+        activity = [row['last'] for row in sources if row and row['last']]
+        rows.append(UserProgressStats(
+            user_id=user_id,
+            answers_total=answers.get(user_id, {}).get('total', 0),
+            answers_correct=correct.get(user_id, {}).get('total', 0),
+            chapters_completed=chapters.get(user_id, {}).get('total', 0),
+            badges_earned=badges.get(user_id, {}).get('total', 0),
+            last_active_at=max(activity) if activity else None,
+        ))
+    UserProgressStats.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('learning', '0014_chapter_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserProgressStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='progress_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('answers_total', models.PositiveIntegerField(default=0)),
+                ('answers_correct', models.PositiveIntegerField(default=0)),
+                ('chapters_completed', models.PositiveIntegerField(default=0)),
+                ('badges_earned', models.PositiveIntegerField(default=0)),
+                ('last_active_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'user progress stats',
+            },
+        ),
+        migrations.RunPython(backfill_stats, migrations.RunPython.noop),
+    ]
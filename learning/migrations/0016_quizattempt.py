@@ -0,0 +1,118 @@
+# Generated by Django 4.2 on 2026-10-18 15:54
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import struct
+
+
+# Same layout as learning.attempts: uint32 question id + option byte with the
+# high bit set for a correct answer.
+ANSWER_STRUCT = struct.Struct('<IB')
+SUBMISSION_GAP_SECONDS = 60
+
+
+def fold_user_answers(apps, schema_editor):
+    """Group legacy UserAnswer rows into QuizAttempt rows.
+
+    Rows from one submission share user and quiz and were written within a
+    moment of each other; a repeated question or a gap of over a minute starts
+    a new attempt. The UserAnswer rows are left in place for archival.
+    """
+    UserAnswer = apps.get_model('learning', 'UserAnswer')
+    Question = apps.get_model('learning', 'Question')
+    QuizAttempt = apps.get_model('learning', 'QuizAttempt')
+
+    quiz_sizes = {}
+    for quiz_id in Question.objects.values_list('quiz_id', flat=True):
+        quiz_sizes[quiz_id] = quiz_sizes.get(quiz_id, 0) + 1
+
+    batch = []
+
+    def flush_group(group):
+        user_id, quiz_id = group['user_id'], group['quiz_id']
+        answers = group['answers']
+        correct = sum(1 for _, _, is_correct in answers if is_correct)
+        total = quiz_sizes.get(quiz_id, len(answers))
+        batch.append(QuizAttempt(
+            user_id=user_id,
+            quiz_id=quiz_id,
+            idempotency_key=f"legacy-{group['first_id']}",
+            correct_count=correct,
+            answered_count=len(answers),
+            total_questions=total,
+            score_percent=int(correct / total * 100) if total else 0,
+            xp_earned=correct * 10,
+            answers=b''.join(
+                ANSWER_STRUCT.pack(qid, option | (0x80 if is_correct else 0))
+                for qid, option, is_correct in answers
+            ),
+            submitted_at=group['last_at'],
+        ))
+        if len(batch) >= 1000:
+            QuizAttempt.objects.bulk_create(batch)
+            batch.clear()
+
+    rows = (
+        UserAnswer.objects.order_by('user_id', 'question__quiz_id', 'answered_at', 'id')
+        .values_list('id', 'user_id', 'question__quiz_id', 'question_id', 'selected_option', 'is_correct', 'answered_at')
+        .iterator(chunk_size=2000)
+    )
+    group = None
+    for answer_id, user_id, quiz_id, question_id, option, is_correct, answered_at in rows:
+        starts_new = (
+            group is None
+            or (group['user_id'], group['quiz_id']) != (user_id, quiz_id)
+            or question_id in group['questions']
+            or (answered_at - group['last_at']).total_seconds() > SUBMISSION_GAP_SECONDS
+        )
+        if starts_new:
+            if group:
+                flush_group(group)
+            group = {'user_id': user_id, 'quiz_id': quiz_id, 'first_id': answer_id,
+                     'questions': set(), 'answers': [], 'last_at': answered_at}
+        group['questions'].add(question_id)
+        group['answers'].append((question_id, option, is_correct))
+        group['last_at'] = answered_at
+    if group:
+        flush_group(group)
+    if batch:
+        QuizAttempt.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('learning', '0015_userprogressstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizAttempt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('idempotency_key', models.CharField(max_length=64)),
+                ('correct_count', models.PositiveSmallIntegerField(default=0)),
+                ('answered_count', models.PositiveSmallIntegerField(default=0)),
+                ('total_questions', models.PositiveSmallIntegerField(default=0)),
+                ('score_percent', models.PositiveSmallIntegerField(default=0)),
+                ('xp_earned', models.IntegerField(default=0)),
+                ('duration_seconds', models.PositiveIntegerField(blank=True, null=True)),
+                ('answers', models.BinaryField(default=bytes)),
+                ('submitted_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attempts', to='learning.quiz')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quiz_attempts', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='quizattempt',
+            index=models.Index(fields=['user', 'quiz'], name='learning_qu_user_id_4f9911_idx'),
+        ),
+        migrations.RunPython(fold_user_answers, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='quizattempt',
+            constraint=models.UniqueConstraint(fields=('user', 'idempotency_key'), name='unique_attempt_idempotency_key'),
+        ),
+    ]
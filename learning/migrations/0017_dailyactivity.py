@@ -0,0 +1,35 @@
+# Generated by Django 4.2 on 2026-10-18 15:58
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('learning', '0016_quizattempt'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('answers', models.PositiveIntegerField(default=0)),
+                ('correct', models.PositiveIntegerField(default=0)),
+                ('xp_earned', models.IntegerField(default=0)),
+                ('chapters_completed', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_activity', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'daily activity',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailyactivity',
+            constraint=models.UniqueConstraint(fields=('user', 'date'), name='unique_user_day'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2 on 2026-10-18 16:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('learning', '0017_dailyactivity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionStats',
+            fields=[
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='learning.question')),
+                ('answers', models.PositiveIntegerField(default=0)),
+                ('correct', models.PositiveIntegerField(default=0)),
+                ('p_value', models.FloatField(blank=True, null=True)),
+                ('discrimination', models.FloatField(blank=True, null=True)),
+                ('option1_count', models.PositiveIntegerField(default=0)),
+                ('option2_count', models.PositiveIntegerField(default=0)),
+                ('option3_count', models.PositiveIntegerField(default=0)),
+                ('option4_count', models.PositiveIntegerField(default=0)),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name_plural': 'question stats',
+            },
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 4.2 on 2026-10-18 16:40
+
+import uuid
+
+from django.db import migrations, models
+from django.utils.text import slugify
+
+import learning.models
+
+
+def populate_slugs(apps, schema_editor):
+    Chapter = apps.get_model('learning', 'Chapter')
+    Quiz = apps.get_model('learning', 'Quiz')
+    Question = apps.get_model('learning', 'Question')
+
+    seen = set()
+    for chapter in Chapter.objects.order_by('id'):
+        slug = slugify(chapter.title)[:90] or f"chapter-{chapter.id}"
+        if slug in seen:
+            slug = f"{slug}-{chapter.id}"
+        seen.add(slug)
+        chapter.slug = slug
+        chapter.save(update_fields=['slug'])
+
+    for quiz in Quiz.objects.order_by('id'):
+        quiz.slug = f"quiz-{uuid.uuid4().hex[:12]}"
+        quiz.save(update_fields=['slug'])
+
+    questions = list(Question.objects.only('id'))
+    for question in questions:
+        question.slug = f"q-{uuid.uuid4().hex[:12]}"
+    Question.objects.bulk_update(questions, ['slug'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('learning', '0018_questionstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chapter',
+            name='slug',
+            field=models.SlugField(blank=True, max_length=100, default=''),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='slug',
+            field=models.SlugField(blank=True, max_length=100, default=''),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='slug',
+            field=models.SlugField(blank=True, max_length=100, default=''),
+            preserve_default=False,
+        ),
+        migrations.RunPython(populate_slugs, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='chapter',
+            name='slug',
+            field=models.SlugField(blank=True, max_length=100, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='question',
+            name='slug',
+            field=models.SlugField(default=learning.models.new_question_slug, max_length=100, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='quiz',
+            name='slug',
+            field=models.SlugField(default=learning.models.new_quiz_slug, max_length=100, unique=True),
+        ),
+    ]
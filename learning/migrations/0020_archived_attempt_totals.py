@@ -0,0 +1,28 @@
+# Generated by Django 4.2 on 2026-10-18 16:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('learning', '0019_content_slugs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprogressstats',
+            name='archived_answers_correct',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprogressstats',
+            name='archived_answers_total',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprogressstats',
+            name='attempts_archived_before',
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
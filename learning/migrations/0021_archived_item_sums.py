@@ -0,0 +1,58 @@
+# Generated by Django 4.2 on 2026-10-18 16:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('learning', '0020_archived_attempt_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='questionstats',
+            name='archived_answers',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='questionstats',
+            name='archived_correct',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='questionstats',
+            name='archived_correct_rest',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='questionstats',
+            name='archived_option1_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='questionstats',
+            name='archived_option2_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='questionstats',
+            name='archived_option3_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='questionstats',
+            name='archived_option4_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='questionstats',
+            name='archived_rest',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='questionstats',
+            name='archived_rest_sq',
+            field=models.FloatField(default=0),
+        ),
+    ]
@@ -1,18 +1,56 @@
+import hashlib
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
+from django.utils.text import slugify
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
+# Content rows carry a stable slug so content packs (manage.py import_content)
+# can update them in place. Rows created without one get a random slug.
+def new_quiz_slug():
+    return f"quiz-{uuid.uuid4().hex[:12]}"
+
+
+def new_question_slug():
+    return f"q-{uuid.uuid4().hex[:12]}"
+
 # ----------------------------
 # CHAPTER
 # ----------------------------
 class Chapter(models.Model):
     title = models.CharField(max_length=255)
+    slug = models.SlugField(max_length=100, unique=True, blank=True)
     content = models.TextField()
     order = models.PositiveIntegerField()
     is_locked = models.BooleanField(default=True)
     image = models.ImageField(upload_to='chapter_images/', blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    content_hash = models.CharField(max_length=64, blank=True, editable=False)
+
+    def save(self, *args, **kwargs):
+        self.content_hash = hashlib.sha256(self.content.encode('utf-8')).hexdigest()
+        prefix = None
+        if not self.slug:
+            base = slugify(self.title)[:90]
+            if base and not Chapter.objects.filter(slug=base).exclude(pk=self.pk).exists():
+                self.slug = base
+            else:
+                # Taken or unsluggable title: same fallback as the slug
+                # migration, <slug>-<id> or chapter-<id>. New rows have no id
+                # yet, so they are inserted with a placeholder first.
+                prefix = base or 'chapter'
+                if self.pk is not None:
+                    self.slug = f"{prefix}-{self.pk}"
+                    prefix = None
+                else:
+                    self.slug = f"chapter-{uuid.uuid4().hex[:12]}"
+        super().save(*args, **kwargs)
+        if prefix is not None:
+            self.slug = f"{prefix}-{self.pk}"
+            Chapter.objects.filter(pk=self.pk).update(slug=self.slug)
 
     def __str__(self):
         return self.title
@@ -23,6 +61,7 @@ class Chapter(models.Model):
 class Quiz(models.Model):
     chapter = models.ForeignKey(Chapter, on_delete=models.CASCADE, related_name='quizzes')
     title = models.CharField(max_length=255)
+    slug = models.SlugField(max_length=100, unique=True, default=new_quiz_slug)
 
     def __str__(self):
         return f"{self.chapter.title} - {self.title}"
@@ -35,6 +74,7 @@ class Question(models.Model):
     option3 = models.CharField(max_length=255)
     option4 = models.CharField(max_length=255)
     correct_option = models.IntegerField(choices=[(1,'Option 1'),(2,'Option 2'),(3,'Option 3'),(4,'Option 4')])
+    slug = models.SlugField(max_length=100, unique=True, default=new_question_slug)
 
     def __str__(self):
         return self.question_text
@@ -49,23 +89,101 @@ class UserAnswer(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.question.id}"
 
+class QuizAttempt(models.Model):
+    """One graded quiz submission.
+
+    ``answers`` packs every (question, selected option, correct) triple into
+    five bytes; see ``learning.attempts`` for the format. ``idempotency_key``
+    comes from the quiz form, so a double submit replays the first attempt
+    instead of writing (and paying XP) again.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='quiz_attempts')
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='attempts')
+    idempotency_key = models.CharField(max_length=64)
+    correct_count = models.PositiveSmallIntegerField(default=0)
+    answered_count = models.PositiveSmallIntegerField(default=0)
+    total_questions = models.PositiveSmallIntegerField(default=0)
+    score_percent = models.PositiveSmallIntegerField(default=0)
+    xp_earned = models.IntegerField(default=0)
+    duration_seconds = models.PositiveIntegerField(null=True, blank=True)
+    answers = models.BinaryField(default=bytes)
+    submitted_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'idempotency_key'], name='unique_attempt_idempotency_key'),
+        ]
+        indexes = [models.Index(fields=['user', 'quiz'])]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.quiz.title} ({self.score_percent}%)"
+
+class QuestionStats(models.Model):
+    """Item analysis for one question, written by ``manage.py compute_question_stats``.
+
+    ``p_value`` is the share of correct answers (difficulty) and
+    ``discrimination`` the point-biserial correlation between answering this
+    question correctly and the rest of the attempt's score.
+    """
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    answers = models.PositiveIntegerField(default=0)
+    correct = models.PositiveIntegerField(default=0)
+    p_value = models.FloatField(null=True, blank=True)
+    discrimination = models.FloatField(null=True, blank=True)
+    option1_count = models.PositiveIntegerField(default=0)
+    option2_count = models.PositiveIntegerField(default=0)
+    option3_count = models.PositiveIntegerField(default=0)
+    option4_count = models.PositiveIntegerField(default=0)
+    computed_at = models.DateTimeField(default=timezone.now)
+    # Item sums of the attempts moved out by manage.py archive_answers;
+    # compute_question_stats starts from them (see analytics.ItemSums).
+    archived_answers = models.PositiveIntegerField(default=0)
+    archived_correct = models.PositiveIntegerField(default=0)
+    archived_rest = models.FloatField(default=0)
+    archived_rest_sq = models.FloatField(default=0)
+    archived_correct_rest = models.FloatField(default=0)
+    archived_option1_count = models.PositiveIntegerField(default=0)
+    archived_option2_count = models.PositiveIntegerField(default=0)
+    archived_option3_count = models.PositiveIntegerField(default=0)
+    archived_option4_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "question stats"
+
+    def __str__(self):
+        return f"Stats for question {self.question_id}"
+
 # ----------------------------
 # BADGES & ACHIEVEMENTS
 # ----------------------------
 class Badge(models.Model):
     name = models.CharField(max_length=50)
+    slug = models.SlugField(max_length=60, unique=True, blank=True)
     description = models.TextField(blank=True)
     image = models.ImageField(upload_to='badges/', blank=True, null=True)
+    icon_emoji = models.CharField(max_length=8, default='🏆')
+    requirement_label = models.CharField(max_length=100, blank=True)
+
+    def save(self, *args, **kwargs):
+        if not self.slug:
+            self.slug = slugify(self.name)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
 
 class Achievement(models.Model):
     name = models.CharField(max_length=100)
+    slug = models.SlugField(max_length=110, unique=True, blank=True)
     description = models.TextField()
     xp_required = models.IntegerField(blank=True, null=True)
     chapter = models.ForeignKey(Chapter, on_delete=models.CASCADE, null=True, blank=True)
 
+    def save(self, *args, **kwargs):
+        if not self.slug:
+            self.slug = slugify(self.name)
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.name
 
@@ -77,6 +195,20 @@ class UserAchievement(models.Model):
 
     class Meta:
         unique_together = ('user', 'achievement', 'badge')
+        # unique_together ignores rows where either column is NULL, so each
+        # kind of award also gets its own partial unique index.
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'badge'],
+                condition=models.Q(badge__isnull=False),
+                name='unique_user_badge',
+            ),
+            models.UniqueConstraint(
+                fields=['user', 'achievement'],
+                condition=models.Q(achievement__isnull=False),
+                name='unique_user_achievement',
+            ),
+        ]
 
     def __str__(self):
         if self.achievement:
@@ -90,7 +222,7 @@ class UserAchievement(models.Model):
 # ----------------------------
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="learning_profile")
-    xp = models.IntegerField(default=0)
+    xp = models.IntegerField(default=0, db_index=True)
     level = models.IntegerField(default=1)
     badges = models.ManyToManyField(Badge, blank=True)
     profile_picture = models.ImageField(upload_to='profile_pics/', blank=True, null=True)
@@ -99,6 +231,30 @@ class UserProfile(models.Model):
         return f"{self.user.username} - Level {self.level}"
 
 
+# ----------------------------
+# XP LEDGER
+# ----------------------------
+class XPEvent(models.Model):
+    SOURCE_QUIZ = 'quiz'
+    SOURCE_CHAPTER = 'chapter'
+    SOURCE_GAME = 'game'
+    SOURCE_OPENING_BALANCE = 'opening_balance'
+    SOURCE_CHOICES = [
+        (SOURCE_QUIZ, 'Quiz'),
+        (SOURCE_CHAPTER, 'Chapter'),
+        (SOURCE_GAME, 'Game'),
+        (SOURCE_OPENING_BALANCE, 'Opening balance'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="xp_events")
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    amount = models.IntegerField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.user.username} {self.amount:+d} XP ({self.source})"
+
+
 # ----------------------------
 # USER CHAPTER COMPLETION
 # ----------------------------
@@ -113,6 +269,47 @@ class UserChapterCompletion(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.chapter.title}"
 
+# ----------------------------
+# USER PROGRESS STATS (denormalized counters)
+# ----------------------------
+class UserProgressStats(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="progress_stats")
+    answers_total = models.PositiveIntegerField(default=0)
+    answers_correct = models.PositiveIntegerField(default=0)
+    chapters_completed = models.PositiveIntegerField(default=0)
+    badges_earned = models.PositiveIntegerField(default=0)
+    last_active_at = models.DateTimeField(null=True, blank=True)
+    # Totals of the attempts moved out by manage.py archive_answers; rebuilds
+    # add them to what is still in QuizAttempt. DailyActivity rows dated
+    # before ``attempts_archived_before`` keep their answer counts on rebuild.
+    archived_answers_total = models.PositiveIntegerField(default=0)
+    archived_answers_correct = models.PositiveIntegerField(default=0)
+    attempts_archived_before = models.DateField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = "user progress stats"
+
+    def __str__(self):
+        return f"{self.user.username} - {self.answers_correct}/{self.answers_total} correct"
+
+class DailyActivity(models.Model):
+    """Per-user, per-day activity totals behind streaks and the dashboard heatmap."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="daily_activity")
+    date = models.DateField()
+    answers = models.PositiveIntegerField(default=0)
+    correct = models.PositiveIntegerField(default=0)
+    xp_earned = models.IntegerField(default=0)
+    chapters_completed = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "daily activity"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date'], name='unique_user_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.date}"
+
 # ----------------------------
 # SIGNALS: Automatically create UserProfile for new users
 # ----------------------------
@@ -120,6 +317,7 @@ class UserChapterCompletion(models.Model):
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
         UserProfile.objects.create(user=instance)
+        UserProgressStats.objects.create(user=instance)
 
 @receiver(post_save, sender=User)
 def save_user_profile(sender, instance, **kwargs):
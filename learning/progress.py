@@ -0,0 +1,82 @@
+# learning/progress.py
+import uuid
+
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.utils import timezone
+
+from .models import UserChapterCompletion
+
+UNLOCK_STATE_TIMEOUT = 60 * 60
+CHAPTERS_VERSION_KEY = "learning:chapters:version"
+
+# Dashboard fragments: the shared top learners block just expires, the
+# per-user ones are keyed by user id and dropped by invalidate_dashboard().
+TOP_LEARNERS_TIMEOUT = 60
+DASHBOARD_FRAGMENT_TIMEOUT = 60 * 60
+DASHBOARD_USER_FRAGMENTS = ("dashboard_recent_badges",)
+# The activity fragment is also keyed by day so streaks roll over at midnight.
+DASHBOARD_ACTIVITY_FRAGMENT = "dashboard_activity"
+
+
+class ChapterUnlockState:
+    """A user's completed chapters and the unlock rule derived from them.
+
+    A chapter is unlocked when it is the first chapter, when the user already
+    completed it, or when the chapter right before it is completed.
+    """
+
+    def __init__(self, completed):
+        # completed: {chapter_id: chapter_order}
+        self.completed_ids = frozenset(completed)
+        self.completed_orders = frozenset(completed.values())
+
+    def is_completed(self, chapter):
+        return chapter.id in self.completed_ids
+
+    def is_unlocked(self, chapter):
+        return (
+            chapter.order == 1
+            or chapter.id in self.completed_ids
+            or (chapter.order - 1) in self.completed_orders
+        )
+
+
+def chapters_version():
+    # A random token, so a version key lost to culling can never point back
+    # at unlock state or a catalog cached before the last chapter edit.
+    return cache.get_or_set(CHAPTERS_VERSION_KEY, lambda: uuid.uuid4().hex, None)
+
+
+def bump_chapters_version():
+    cache.set(CHAPTERS_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def _unlock_state_key(user_id):
+    return f"learning:unlocks:{user_id}:v{chapters_version()}"
+
+
+def get_unlock_state(user):
+    """Return the cached ChapterUnlockState for ``user`` (one query on a miss)."""
+    key = _unlock_state_key(user.id)
+    completed = cache.get(key)
+    if completed is None:
+        completed = dict(
+            UserChapterCompletion.objects.filter(user=user)
+            .values_list("chapter_id", "chapter__order")
+        )
+        cache.set(key, completed, UNLOCK_STATE_TIMEOUT)
+    return ChapterUnlockState(completed)
+
+
+def invalidate_unlock_state(user_id):
+    cache.delete(_unlock_state_key(user_id))
+
+
+def invalidate_dashboard(user_id):
+    """Drop the user's cached dashboard fragments after XP, badges or completions change."""
+    keys = [make_template_fragment_key(name, [user_id]) for name in DASHBOARD_USER_FRAGMENTS]
+    keys.append(make_template_fragment_key(
+        DASHBOARD_ACTIVITY_FRAGMENT, [user_id, timezone.localdate().isoformat()]
+    ))
+    cache.delete_many(keys)
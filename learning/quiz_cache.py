@@ -0,0 +1,47 @@
+# learning/quiz_cache.py
+import uuid
+
+from django.core.cache import cache
+
+from .models import Question
+
+QUIZ_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def _version_key(quiz_id):
+    return f"learning:quiz:{quiz_id}:version"
+
+
+def _payload_key(quiz_id):
+    # A random token, so a version key lost to culling can never point back
+    # at a payload cached before the last edit.
+    version = cache.get_or_set(_version_key(quiz_id), lambda: uuid.uuid4().hex, None)
+    return f"learning:quiz:{quiz_id}:v{version}"
+
+
+def get_quiz_payload(quiz_id):
+    """Return the cached question payload and answer key for a quiz.
+
+    ``questions`` holds what the quiz page renders (id, text and the four
+    options) and ``answer_key`` maps question id to its correct option, so
+    neither showing nor grading a quiz queries ``learning_question`` once the
+    entry is warm.
+    """
+    key = _payload_key(quiz_id)
+    payload = cache.get(key)
+    if payload is None:
+        rows = Question.objects.filter(quiz_id=quiz_id).order_by("id").values(
+            "id", "question_text", "option1", "option2", "option3", "option4", "correct_option"
+        )
+        questions, answer_key = [], {}
+        for row in rows:
+            answer_key[row["id"]] = row.pop("correct_option")
+            questions.append(row)
+        payload = {"questions": questions, "answer_key": answer_key}
+        cache.set(key, payload, QUIZ_CACHE_TIMEOUT)
+    return payload
+
+
+def invalidate_quiz(quiz_id):
+    """Move the quiz to a new cache version after staff edit it."""
+    cache.set(_version_key(quiz_id), uuid.uuid4().hex, None)
@@ -1,10 +1,36 @@
 # learning/signals.py
-# from django.db.models.signals import post_save
-# from django.dispatch import receiver
-# from django.contrib.auth.models import User
-# from .models import UserProfile
-
-# @receiver(post_save, sender=User)
-# def create_user_profile(sender, instance, created, **kwargs):
-#     if created:
-#         UserProfile.objects.create(user=instance)
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .badges import invalidate_catalog
+from .models import Achievement, Badge, Chapter, Question, Quiz, UserChapterCompletion
+from .progress import bump_chapters_version, invalidate_dashboard, invalidate_unlock_state
+from .quiz_cache import invalidate_quiz
+
+
+@receiver([post_save, post_delete], sender=UserChapterCompletion)
+def completion_changed(sender, instance, **kwargs):
+    invalidate_unlock_state(instance.user_id)
+    invalidate_dashboard(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=Chapter)
+def chapter_changed(sender, instance, **kwargs):
+    # Cached unlock state stores chapter orders, so reordering invalidates it.
+    bump_chapters_version()
+
+
+@receiver([post_save, post_delete], sender=Badge)
+@receiver([post_save, post_delete], sender=Achievement)
+def badge_catalog_changed(sender, instance, **kwargs):
+    invalidate_catalog()
+
+
+@receiver([post_save, post_delete], sender=Question)
+def question_changed(sender, instance, **kwargs):
+    invalidate_quiz(instance.quiz_id)
+
+
+@receiver([post_save, post_delete], sender=Quiz)
+def quiz_changed(sender, instance, **kwargs):
+    invalidate_quiz(instance.id)
@@ -0,0 +1,101 @@
+# learning/stats.py
+from django.contrib.auth.models import User
+from django.db.models import Count, F, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import QuizAttempt, UserAchievement, UserChapterCompletion, UserProgressStats
+
+COUNTER_FIELDS = ('answers_total', 'answers_correct', 'chapters_completed', 'badges_earned')
+
+
+def get_stats(user):
+    """One primary-key lookup; users without a row get zeroed counters."""
+    return UserProgressStats.objects.filter(pk=user.pk).first() or UserProgressStats(user=user)
+
+
+def bump_stats(user, **deltas):
+    """Add ``deltas`` to the user's counters and touch ``last_active_at``.
+
+    Call it inside the same transaction as the write being counted. Missing
+    rows (users created before the table existed) are rebuilt from scratch,
+    which already includes the write.
+    """
+    unknown = set(deltas) - set(COUNTER_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown progress counters: {', '.join(sorted(unknown))}")
+    updates = {field: F(field) + amount for field, amount in deltas.items() if amount}
+    updated = UserProgressStats.objects.filter(pk=user.pk).update(last_active_at=timezone.now(), **updates)
+    if not updated:
+        rebuild_progress_stats(user_ids=[user.pk])
+
+
+def _count(model, **filters):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(user=OuterRef('pk'), **filters)
+            .order_by().values('user').annotate(count=Count('pk')).values('count')
+        ),
+        0,
+    )
+
+
+def _sum(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(user=OuterRef('pk'))
+            .order_by().values('user').annotate(total=Sum(field)).values('total')
+        ),
+        0,
+    )
+
+
+def _latest(model, field):
+    return Subquery(
+        model.objects.filter(user=OuterRef('pk'))
+        .order_by().values('user').annotate(latest=Max(field)).values('latest')
+    )
+
+
+def rebuild_progress_stats(user_ids=None, batch_size=1000):
+    """Recompute every counter from the source tables and upsert in batches.
+
+    Answer counters include the totals of archived attempts. Returns the number of stats rows written.
+    """
+    users = User.objects.order_by('pk').annotate(
+        answers_total=Coalesce(F('progress_stats__archived_answers_total'), 0) + _sum(QuizAttempt, 'answered_count'),
+        answers_correct=Coalesce(F('progress_stats__archived_answers_correct'), 0) + _sum(QuizAttempt, 'correct_count'),
+        chapters_completed=_count(UserChapterCompletion),
+        badges_earned=_count(UserAchievement, badge__isnull=False),
+        last_answer=_latest(QuizAttempt, 'submitted_at'),
+        last_completion=_latest(UserChapterCompletion, 'completed_at'),
+        last_award=_latest(UserAchievement, 'earned_at'),
+    )
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+
+    written = 0
+    batch = []
+    for user in users.iterator(chunk_size=batch_size):
+        activity = [d for d in (user.last_answer, user.last_completion, user.last_award) if d]
+        batch.append(UserProgressStats(
+            user_id=user.pk,
+            last_active_at=max(activity) if activity else None,
+            **{field: getattr(user, field) for field in COUNTER_FIELDS},
+        ))
+        if len(batch) >= batch_size:
+            written += _upsert(batch)
+            batch = []
+    if batch:
+        written += _upsert(batch)
+    return written
+
+
+def _upsert(rows):
+    UserProgressStats.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['user'],
+        update_fields=[*COUNTER_FIELDS, 'last_active_at'],
+    )
+    return len(rows)
@@ -12,4 +12,6 @@ urlpatterns = [
 
     path('leaderboard/', views.leaderboard, name='leaderboard'),
     path('achievements/', views.achievements, name='achievements'),
+    path('staff/bulk-grade/', views.bulk_grade, name='bulk_grade'),
+    path('staff/export/<str:dataset>.<str:fmt>', views.export_progress, name='export_progress'),
 ]
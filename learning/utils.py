@@ -1,15 +1,13 @@
 # learning/utils.py
-from .models import Badge, UserAchievement
+from django.utils.text import slugify
+
+from .badges import get_catalog, grant
+from .models import UserAchievement
 
 def award_badge(user, badge_name):
     """Award badge to user if not already earned"""
-    badge = Badge.objects.filter(name=badge_name).first()
-    profile = user.learning_profile
-
-    if badge and badge not in profile.badges.all():
-        profile.badges.add(badge)
-        profile.save()
-        # Save achievement history
-        UserAchievement.objects.create(user=user, badge=badge)
-        return True
-    return False
+    badge = get_catalog().badges.get(slugify(badge_name))
+    if badge is None or UserAchievement.objects.filter(user=user, badge=badge).exists():
+        return False
+    grant(user, user.learning_profile, badges=[badge])
+    return True
@@ -1,30 +1,46 @@
+import time
+import uuid
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse
-from .models import Chapter, Quiz, Question, UserAnswer, UserProfile, Achievement, UserAchievement, Badge, UserChapterCompletion
-from .utils import award_badge
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.db import IntegrityError, transaction
+from django.core.paginator import Paginator
+from django.db.models import Avg, Count, F, Q, Sum, Window
+from django.db.models.functions import Coalesce, Rank
+from . import exports, write_behind
+from .activity import record_activity
+from .attempts import grade, pack_answers
+from .bulk_grading import SheetError, grade_sheet
+from .models import Chapter, Quiz, UserProfile, UserAchievement, Badge, UserChapterCompletion, XPEvent, QuizAttempt
+from .chapter_cache import chapter_etag, get_chapter_catalog, get_chapter_html
+from .progress import get_unlock_state
+from .quiz_cache import get_quiz_payload
+from .stats import bump_stats
+from .badges import EVENT_CHAPTER, EVENT_QUIZ, evaluate_awards, get_catalog
+from .xp import award_xp
 
 # ----------------------------
 # CHAPTER LIST
 # ----------------------------
 @login_required
 def chapter_list(request):
-    chapters = Chapter.objects.order_by("order")
+    chapters = get_chapter_catalog()
     
-    # Get chapters completed by the current user
-    completed_chapters = UserChapterCompletion.objects.filter(user=request.user).values_list('chapter_id', flat=True)
+    # Chapters completed by the current user, computed once per request
+    unlock_state = get_unlock_state(request.user)
     
     # Build chapter status: unlock chapters based on previous chapter completion
     chapter_data = []
     for chapter in chapters:
-        # First chapter is always unlocked
-        is_unlocked = chapter.order == 1 or (chapter.order - 1 <= max(c.order for c in Chapter.objects.filter(id__in=completed_chapters)) if completed_chapters else False)
-        is_completed = chapter.id in completed_chapters
-        
         chapter_data.append({
             'chapter': chapter,
-            'is_unlocked': is_unlocked,
-            'is_completed': is_completed
+            'is_unlocked': unlock_state.is_unlocked(chapter),
+            'is_completed': unlock_state.is_completed(chapter)
         })
     
     return render(request, "learning/chapter.html", {"chapters": chapter_data})
@@ -34,18 +50,25 @@ def chapter_list(request):
 # ----------------------------
 @login_required
 def chapter_detail(request, pk):
-    chapter = get_object_or_404(Chapter, pk=pk)
-    
-    # Check if chapter is unlocked for this user
-    completed_chapters = UserChapterCompletion.objects.filter(user=request.user).values_list('chapter__order', flat=True)
+    chapter = get_object_or_404(Chapter.objects.defer('content'), pk=pk)
     
     # User can access if chapter is first or previous chapter is completed
-    can_access = chapter.order == 1 or (chapter.order - 1) in completed_chapters
-    
-    if not can_access:
+    if not get_unlock_state(request.user).is_unlocked(chapter):
         return HttpResponse("This chapter is locked. Complete the previous chapter first.", status=403)
     
-    return render(request, "learning/chapter_detail.html", {"chapter": chapter})
+    # Repeat visits revalidate with ETag / Last-Modified and get a 304
+    # without the body being loaded or rendered.
+    etag = chapter_etag(chapter, request)
+    response = get_conditional_response(request, etag=etag, last_modified=int(chapter.updated_at.timestamp()))
+    if response is None:
+        response = render(request, "learning/chapter_detail.html", {
+            "chapter": chapter,
+            "chapter_html": get_chapter_html(chapter),
+        })
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(chapter.updated_at.timestamp())
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 # ----------------------------
 # CHAPTER QUIZ
@@ -54,23 +77,21 @@ def chapter_detail(request, pk):
 def chapter_quiz(request, chapter_id):
     chapter = get_object_or_404(Chapter, id=chapter_id)
     
-    # Check if chapter is unlocked for this user
-    completed_chapters = UserChapterCompletion.objects.filter(user=request.user).values_list('chapter__order', flat=True)
-    
     # User can access if chapter is first or previous chapter is completed
-    can_access = chapter.order == 1 or (chapter.order - 1) in completed_chapters
-    
-    if not can_access:
+    if not get_unlock_state(request.user).is_unlocked(chapter):
         return HttpResponse("This chapter is locked. Complete the previous chapter first.", status=403)
     
     quiz = chapter.quizzes.first()
     if not quiz:
         return HttpResponse("No quiz available for this chapter.", status=404)
-    questions = quiz.questions.all()
+    questions = get_quiz_payload(quiz.id)["questions"]
     return render(request, "learning/chapter_quiz.html", {
         "chapter": chapter,
         "quiz": quiz,
-        "questions": questions
+        "questions": questions,
+        # Lets submit_quiz recognise a repeated submit of this form.
+        "idempotency_key": uuid.uuid4().hex,
+        "started_at": int(time.time()),
     })
 
 # ----------------------------
@@ -78,110 +99,219 @@ def chapter_quiz(request, chapter_id):
 # ----------------------------
 @login_required
 def submit_quiz(request, quiz_id):
-    quiz = get_object_or_404(Quiz, id=quiz_id)
-    total_questions = quiz.questions.count()
-    correct_count = 0
+    """
+    Grade a quiz submission and apply XP, level, completion and badges.
 
-    if request.method == "POST":
-        for question in quiz.questions.all():
-            selected_option = request.POST.get(f"question_{question.id}")
-            if not selected_option:
-                continue
-            selected_option = int(selected_option)
-            is_correct = selected_option == question.correct_option
-            if is_correct:
-                correct_count += 1
-            UserAnswer.objects.create(
-                user=request.user,
-                question=question,
-                selected_option=selected_option,
-                is_correct=is_correct
-            )
+    Answers are graded in memory against the cached answer key and stored as
+    one QuizAttempt with the selections packed into a single column. Every
+    write happens inside one transaction, so the query budget does not depend
+    on the number of questions: the quiz (with its chapter) is read once, the
+    attempt is inserted, then the profile update, chapter completion,
+    progress counters, today's activity row and one pass of the badge rules
+    follow.
 
-    # XP & LEVEL LOGIC
-    xp_earned = correct_count * 10  # 10 XP per correct answer
-    profile, created = UserProfile.objects.get_or_create(user=request.user)
-    profile.xp += xp_earned
-    profile.level = (profile.xp // 100) + 1
-    profile.save()
+    The form's idempotency key is unique per user: a repeated submit (double
+    click, browser retry) replays the stored attempt without awarding again.
+    With LEARNING_WRITE_BEHIND on, nothing is written here: the attempt goes
+    to the write-behind buffer, whose flusher applies it and everything it
+    awards in a batch (see learning/write_behind.py). The result page then
+    shows the level the flush will reach.
+    """
+    quiz = get_object_or_404(Quiz.objects.select_related('chapter'), id=quiz_id)
+    if request.method != "POST":
+        return redirect('learning:chapter_quiz', chapter_id=quiz.chapter_id)
+
+    idempotency_key = request.POST.get("idempotency_key") or uuid.uuid4().hex
+    # Pending first: a batch leaves the buffer only after it has committed.
+    previous = (
+        write_behind.find_pending(request.user.id, idempotency_key)
+        or QuizAttempt.objects.filter(user=request.user, idempotency_key=idempotency_key).first()
+    )
+    if previous:
+        return render_quiz_result(request, quiz, previous)
+
+    # GRADE IN MEMORY
+    answer_key = get_quiz_payload(quiz.id)["answer_key"]
+    total_questions = len(answer_key)
+    graded, correct_count = grade(answer_key, {
+        question_id: request.POST.get(f"question_{question_id}") for question_id in answer_key
+    })
 
+    xp_earned = correct_count * 10  # 10 XP per correct answer
     score_percent = int((correct_count / total_questions) * 100) if total_questions > 0 else 0
 
-    # ACHIEVEMENT / BADGES
-    # 1️⃣ Chapter completion badge
-    if correct_count == total_questions and total_questions > 0:
-        chapter = quiz.chapter
-        # Award chapter completion badge
-        award_badge(request.user, "Chapter King")
-        
-        # Mark chapter as completed to unlock next chapters
-        UserChapterCompletion.objects.get_or_create(user=request.user, chapter=chapter)
-
-    # 2️⃣ Perfect quiz badge
-    if score_percent == 100:
-        award_badge(request.user, "Quiz Master")
-
-    # 3️⃣ XP milestone badges
-    if profile.xp >= 100:
-        award_badge(request.user, "Top Leveler")
-    if profile.xp >= 500:
-        award_badge(request.user, "Supreme Warrior")
+    attempt = QuizAttempt(
+        user=request.user,
+        quiz=quiz,
+        idempotency_key=idempotency_key,
+        correct_count=correct_count,
+        answered_count=len(graded),
+        total_questions=total_questions,
+        score_percent=score_percent,
+        xp_earned=xp_earned,
+        duration_seconds=quiz_duration(request.POST.get("started_at")),
+        answers=pack_answers(graded),
+    )
+    if write_behind.enabled():
+        attempt = write_behind.enqueue(attempt)
+        return render_quiz_result(request, quiz, attempt, level=write_behind.projected_level(request.user.id))
+
+    try:
+        with transaction.atomic():
+            attempt.save()
+
+            # XP & LEVEL LOGIC
+            profile = award_xp(request.user, xp_earned, XPEvent.SOURCE_QUIZ)
 
+            # CHAPTER COMPLETION
+            completed_chapter = None
+            newly_completed = False
+            if correct_count == total_questions and total_questions > 0:
+                completed_chapter = quiz.chapter
+                # Mark chapter as completed to unlock next chapters
+                _, newly_completed = UserChapterCompletion.objects.get_or_create(user=request.user, chapter=completed_chapter)
+
+            # PROGRESS COUNTERS
+            bump_stats(
+                request.user,
+                answers_total=len(graded),
+                answers_correct=correct_count,
+                chapters_completed=int(newly_completed),
+            )
+            record_activity(
+                request.user,
+                answers=len(graded),
+                correct=correct_count,
+                xp_earned=xp_earned,
+                chapters_completed=int(newly_completed),
+            )
+
+            # ACHIEVEMENT / BADGES (chapter, perfect quiz and XP milestone rules)
+            evaluate_awards(
+                request.user, profile, EVENT_QUIZ,
+                perfect_quiz=score_percent == 100,
+                completed_chapter=completed_chapter,
+            )
+    except IntegrityError:
+        # A concurrent request with the same key won the insert.
+        attempt = QuizAttempt.objects.get(user=request.user, idempotency_key=idempotency_key)
+        return render_quiz_result(request, quiz, attempt)
+
+    return render_quiz_result(request, quiz, attempt, level=profile.level)
+
+
+def quiz_duration(started_at):
+    """Seconds since the quiz form was rendered, or None if unknown."""
+    try:
+        started = int(started_at)
+    except (TypeError, ValueError):
+        return None
+    return max(int(time.time()) - started, 0)
+
+
+def render_quiz_result(request, quiz, attempt, level=None):
+    if level is None:
+        level = UserProfile.objects.values_list('level', flat=True).get(user=request.user)
     return render(request, "learning/quiz_result.html", {
         "quiz": quiz,
-        "total": total_questions,
-        "correct": correct_count,
-        "score": score_percent,
-        "xp": xp_earned,
-        "level": profile.level
+        "total": attempt.total_questions,
+        "correct": attempt.correct_count,
+        "score": attempt.score_percent,
+        "xp": attempt.xp_earned,
+        "level": level
     })
 
 # ----------------------------
 # LEADERBOARD
 # ----------------------------
+LEADERBOARD_PAGE_SIZE = 25
+AROUND_ME_SPAN = 5  # learners shown above and below the current user
+
+
+def ranked_profiles():
+    """Profiles ordered by XP with SQL window ranks and per-user counts."""
+    # Per-user counts are joined in from UserProgressStats, so the page costs
+    # the same number of queries no matter how many learners there are.
+    return (
+        UserProfile.objects.select_related('user')
+        .annotate(
+            rank=Window(expression=Rank(), order_by=F('xp').desc()),
+            completed_chapters=Coalesce(F('user__progress_stats__chapters_completed'), 0),
+            total_answers=Coalesce(F('user__progress_stats__answers_total'), 0),
+        )
+        .order_by('-xp', 'id')
+    )
+
+
+def leaderboard_position(profile):
+    """1-based row of ``profile`` in the ``ranked_profiles()`` ordering."""
+    ahead = UserProfile.objects.filter(
+        Q(xp__gt=profile.xp) | Q(xp=profile.xp, id__lt=profile.id)
+    ).count()
+    return ahead + 1
+
+
 def leaderboard(request):
-    profiles = UserProfile.objects.order_by('-xp').select_related('user')
-    
+    ranked = ranked_profiles()
+    around_me = request.GET.get('view') == 'around' and request.user.is_authenticated
+
+    # Locate the current user with one indexed COUNT; their rank is then read
+    # from the RANK() window on that single row.
+    current_user_rank = None
+    position = None
+    if request.user.is_authenticated:
+        profile = UserProfile.objects.filter(user=request.user).only('id', 'xp').first()
+        if profile:
+            position = leaderboard_position(profile)
+
+    page_obj = None
+    if around_me and position:
+        start = max(position - 1 - AROUND_ME_SPAN, 0)
+        profiles = list(ranked[start:position + AROUND_ME_SPAN])
+    else:
+        around_me = False
+        page_obj = Paginator(ranked, LEADERBOARD_PAGE_SIZE).get_page(request.GET.get('page'))
+        profiles = page_obj.object_list
+
     # Build leaderboard data with rankings and stats
     leaderboard_data = []
-    current_user_rank = None
-    
-    for index, profile in enumerate(profiles, 1):
-        # Count completed chapters for this user
-        completed_chapters = UserChapterCompletion.objects.filter(user=profile.user).count()
-        
-        # Count total quiz answers for this user
-        total_answers = UserAnswer.objects.filter(user=profile.user).count()
-        
-        item = {
-            'rank': index,
+    for profile in profiles:
+        is_current_user = request.user.is_authenticated and profile.user_id == request.user.id
+        leaderboard_data.append({
+            'rank': profile.rank,
             'user': profile.user,
             'profile': profile,
             'username': profile.user.username,
             'xp': profile.xp,
             'level': profile.level,
-            'completed_chapters': completed_chapters,
-            'total_answers': total_answers,
-            'is_current_user': request.user.is_authenticated and profile.user == request.user,
-        }
-        leaderboard_data.append(item)
-        
-        if request.user.is_authenticated and profile.user == request.user:
-            current_user_rank = index
-    
+            'completed_chapters': profile.completed_chapters,
+            'total_answers': profile.total_answers,
+            'is_current_user': is_current_user,
+        })
+
+        if is_current_user:
+            current_user_rank = profile.rank
+
+    if current_user_rank is None and position:
+        current_user_rank = ranked[position - 1].rank
+
     # Calculate global stats
-    total_users = UserProfile.objects.count()
-    total_xp = sum(p.xp for p in profiles)
+    stats = UserProfile.objects.aggregate(
+        total_users=Count('id'),
+        total_xp=Coalesce(Sum('xp'), 0),
+        avg_level=Coalesce(Avg('level'), 0.0),
+    )
     total_completions = UserChapterCompletion.objects.count()
-    avg_level = sum(p.level for p in profiles) / total_users if total_users > 0 else 0
-    
+
     context = {
         'leaderboard': leaderboard_data,
+        'page_obj': page_obj,
+        'around_me': around_me,
         'current_user_rank': current_user_rank,
-        'total_users': total_users,
-        'total_xp': total_xp,
+        'total_users': stats['total_users'],
+        'total_xp': stats['total_xp'],
         'total_completions': total_completions,
-        'avg_level': round(avg_level, 1),
+        'avg_level': round(stats['avg_level'], 1),
     }
     return render(request, "learning/leaderboard.html", context)
 
@@ -192,54 +322,31 @@ def leaderboard(request):
 def achievements(request):
     user_profile = request.user.learning_profile
     
-    # Get all badges
-    all_badges = Badge.objects.all()
-    total_badges = all_badges.count()
+    # Badges and their presentation come from the cached catalog; the user's
+    # earned badges and dates are one query.
+    all_badges = get_catalog().badges.values()
+    earned = dict(
+        UserAchievement.objects.filter(user=request.user, badge__isnull=False)
+        .values_list('badge_id', 'earned_at')
+    )
     
     # Prepare badge data for template
     badges = []
-    unlocked_count = 0
-    
     for badge in all_badges:
-        # Check if user has this badge
-        is_unlocked = UserAchievement.objects.filter(user=request.user, badge=badge).exists()
-        if is_unlocked:
-            unlocked_count += 1
-            earned_at = UserAchievement.objects.filter(user=request.user, badge=badge).first().earned_at
-            date_earned = earned_at.date()
-        else:
-            date_earned = None
-        
-        # Hardcode some attributes for now
-        badge_data = {
+        earned_at = earned.get(badge.id)
+        badges.append({
             'name': badge.name,
-            'is_unlocked': is_unlocked,
-            'icon_emoji': '🏆',  # Default emoji
-            'required_chapter': None,  # Will set based on name or logic
-            'date_earned': date_earned,
-        }
-        
-        # Customize based on badge name
-        if 'Supreme' in badge.name:
-            badge_data['icon_emoji'] = '👑'
-            badge_data['required_chapter'] = 'All Chapters'
-        elif 'Quiz' in badge.name:
-            badge_data['icon_emoji'] = '🧠'
-            badge_data['required_chapter'] = 'Perfect Quiz'
-        elif 'Chapter' in badge.name:
-            badge_data['icon_emoji'] = '📖'
-            badge_data['required_chapter'] = 'Complete Chapter'
-        elif 'Level' in badge.name:
-            badge_data['icon_emoji'] = '⭐'
-            badge_data['required_chapter'] = 'Reach Level'
-        
-        badges.append(badge_data)
+            'is_unlocked': earned_at is not None,
+            'icon_emoji': badge.icon_emoji,
+            'required_chapter': badge.requirement_label or None,
+            'date_earned': earned_at.date() if earned_at else None,
+        })
     
     context = {
         'user_profile': user_profile,
         'badges': badges,
-        'unlocked_count': unlocked_count,
-        'total_badges': total_badges,
+        'unlocked_count': sum(1 for badge in badges if badge['is_unlocked']),
+        'total_badges': len(badges),
         'xp_percent': user_profile.xp % 100,
     }
     
@@ -251,23 +358,60 @@ def achievements(request):
 @login_required
 def complete_chapter(request, chapter_id):
     chapter = get_object_or_404(Chapter, id=chapter_id)
-    profile = UserProfile.objects.get(user=request.user)
 
-    # Add XP for completing chapter
-    profile.xp += 50
-    profile.level = (profile.xp // 100) + 1
-    profile.save()
+    with transaction.atomic():
+        # Add XP for completing chapter
+        profile = award_xp(request.user, 50, XPEvent.SOURCE_CHAPTER)
+        record_activity(request.user, xp_earned=50)
 
-    # Award badges based on milestones
-    if profile.xp >= 100:
-        award_badge(request.user, "100 XP Badge")
-    if profile.level >= 2:
-        award_badge(request.user, "Level 2 Badge")
-    if chapter.order == 1:  # first chapter
-        award_badge(request.user, "First Chapter Completed")
+        # Award badges based on milestones
+        evaluate_awards(request.user, profile, EVENT_CHAPTER, completed_chapter=chapter)
+        bump_stats(request.user)
 
     return redirect('accounts:dashboard')
 
+
+# ----------------------------
+# BULK GRADING (staff)
+# ----------------------------
+@staff_member_required
+def bulk_grade(request):
+    """
+    Grade an uploaded sheet of offline answers (see learning/bulk_grading.py).
+    """
+    context = {}
+    if request.method == "POST":
+        sheet = request.FILES.get("sheet")
+        if sheet is None:
+            context["error"] = "Choose a CSV or JSONL file to grade."
+        else:
+            try:
+                context["result"] = grade_sheet(sheet.read(), sheet.name)
+            except SheetError as exc:
+                context["error"] = str(exc)
+    return render(request, "learning/bulk_grade.html", context)
+
+
+# ----------------------------
+# PROGRESS EXPORTS (staff)
+# ----------------------------
+@staff_member_required
+def export_progress(request, dataset, fmt):
+    """
+    Stream the learners or answers dataset as CSV or JSONL.
+
+    Rows are produced while the response is sent (see learning/exports.py),
+    so the first byte goes out right away and memory does not grow with
+    the table size.
+    """
+    if dataset not in exports.DATASETS or fmt not in exports.FORMATS:
+        raise Http404("Unknown export")
+    fields, rows = exports.DATASETS[dataset]
+    content_type, encode = exports.FORMATS[fmt]
+    response = StreamingHttpResponse(encode(fields, rows()), content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{dataset}-{timezone.localdate():%Y%m%d}.{fmt}"'
+    return response
+
 def achievements_view(request):
     # Get logged-in user's profile
     profile = request.user.learning_profile
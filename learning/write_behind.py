@@ -0,0 +1,313 @@
+# learning/write_behind.py
+"""Optional write-behind buffer for quiz submissions.
+
+With ``LEARNING_WRITE_BEHIND`` on, ``submit_quiz`` grades in memory and hands
+the attempt to ``enqueue()`` without writing to the database at all. The
+attempt is appended to this process's spool file (one JSON line, fsynced)
+and kept in memory until a flusher applies the pending attempts as one batch
+with ``bulk_grading.apply_attempts``: the attempt rows, XP events, chapter
+completions, progress counters, daily activity and badges. A flush happens
+when ``LEARNING_WRITE_BEHIND_BATCH_SIZE`` attempts are waiting or every
+``LEARNING_WRITE_BEHIND_INTERVAL`` seconds, whichever comes first.
+
+Each process spools to its own ``<spool>.<pid>-<token>.jsonl`` and holds an
+advisory lock on a matching ``.lock`` file while it lives. The flusher
+adopts the spool files of processes that are gone (their lock is free), at
+startup and on every tick; ``manage.py flush_attempt_spool`` does the same
+once. A batch skips attempts whose idempotency key is already stored or
+repeated in the batch, so replays and concurrent double submits award once.
+"""
+import base64
+import json
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import close_old_connections
+
+from .bulk_grading import apply_attempts
+from .models import Quiz, QuizAttempt, UserProfile
+from .xp import level_for_xp
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, only the command adopts spools.
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SPOOL_FIELDS = (
+    'user_id', 'quiz_id', 'idempotency_key', 'correct_count', 'answered_count',
+    'total_questions', 'score_percent', 'xp_earned', 'duration_seconds',
+)
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def enabled():
+    return getattr(settings, 'LEARNING_WRITE_BEHIND', False)
+
+
+def spool_path():
+    return Path(getattr(settings, 'LEARNING_WRITE_BEHIND_SPOOL', settings.BASE_DIR / 'var' / 'attempt_spool.jsonl'))
+
+
+def serialize(attempt):
+    row = {field: getattr(attempt, field) for field in SPOOL_FIELDS}
+    row['answers'] = base64.b64encode(bytes(attempt.answers)).decode('ascii')
+    row['submitted_at'] = attempt.submitted_at.isoformat()
+    return json.dumps(row, separators=(',', ':'))
+
+
+def deserialize(line):
+    row = json.loads(line)
+    row['answers'] = base64.b64decode(row['answers'])
+    row['submitted_at'] = datetime.fromisoformat(row['submitted_at'])
+    return QuizAttempt(**row)
+
+
+def write_attempts(attempts):
+    """Apply ``attempts`` in one transaction; returns how many were new.
+
+    Attempts for a user or quiz deleted since the submit are dropped.
+    """
+    users = User.objects.in_bulk({attempt.user_id for attempt in attempts})
+    quizzes = Quiz.objects.select_related('chapter').in_bulk({attempt.quiz_id for attempt in attempts})
+    loaded = []
+    for attempt in attempts:
+        if attempt.user_id in users and attempt.quiz_id in quizzes:
+            attempt.user = users[attempt.user_id]
+            attempt.quiz = quizzes[attempt.quiz_id]
+            loaded.append(attempt)
+        else:
+            logger.warning("Dropping spooled attempt %s: its user or quiz is gone", attempt.idempotency_key)
+    return len(apply_attempts(loaded)) if loaded else 0
+
+
+def _lock(path, wait):
+    """Open ``path`` and take an exclusive lock; None if another process holds it."""
+    handle = open(path, 'a', encoding='utf-8')
+    if fcntl is not None:
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | (0 if wait else fcntl.LOCK_NB))
+        except BlockingIOError:
+            handle.close()
+            return None
+    return handle
+
+
+class AttemptBuffer:
+    """This process's pending attempts plus their spool file.
+
+    A flush renames the spool to ``<spool>.flushing`` while it holds the
+    lock, so submits keep appending to a fresh file during the database
+    write. The ``.flushing`` file is deleted only after the batch commits,
+    and ``find()`` keeps answering for the batch until then.
+    """
+
+    def __init__(self, path, batch_size=500, interval=2.0):
+        base = Path(path)
+        self.path = base.with_name(f"{base.stem}.{os.getpid()}-{uuid.uuid4().hex[:8]}{base.suffix}")
+        self.flushing_path = self.path.with_name(self.path.name + '.flushing')
+        self.lock_path = self.path.with_name(self.path.name + '.lock')
+        self.orphan_pattern = f"{base.stem}.*{base.suffix}.lock"
+        self.batch_size = batch_size
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending = []
+        self._flushing = []
+        self._thread = None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._owner_lock = _lock(self.lock_path, wait=True)
+        self._spool = None
+
+    def _open_spool(self):
+        if self._spool is None:
+            self._spool = open(self.path, 'a', encoding='utf-8')
+        return self._spool
+
+    def _append(self, lines, attempts):
+        spool = self._open_spool()
+        spool.writelines(line + '\n' for line in lines)
+        spool.flush()
+        os.fsync(spool.fileno())
+        self._pending += attempts
+
+    def _find(self, user_id, idempotency_key):
+        for attempt in self._flushing + self._pending:
+            if attempt.user_id == user_id and attempt.idempotency_key == idempotency_key:
+                return attempt
+        return None
+
+    def add(self, attempt):
+        """Spool ``attempt``; returns it, or the pending attempt that already has its key."""
+        line = serialize(attempt)
+        with self._lock:
+            existing = self._find(attempt.user_id, attempt.idempotency_key)
+            if existing is not None:
+                return existing
+            self._append([line], [attempt])
+            full = len(self._pending) >= self.batch_size
+        if full:
+            if self._thread is not None:
+                self._wake.set()
+            else:
+                self.flush()
+        return attempt
+
+    def find(self, user_id, idempotency_key):
+        with self._lock:
+            return self._find(user_id, idempotency_key)
+
+    def pending_xp(self, user_id):
+        with self._lock:
+            return sum(attempt.xp_earned for attempt in self._flushing + self._pending if attempt.user_id == user_id)
+
+    def __len__(self):
+        return len(self._pending) + len(self._flushing)
+
+    def flush(self):
+        """Apply every pending attempt; returns how many were new to the database.
+
+        The spool files always hold exactly the pending attempts, so a failed
+        write leaves both the memory queue and the files for the next try.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch, self._pending = self._pending, []
+                self._flushing = batch
+                if self._spool is not None:
+                    self._spool.close()
+                    self._spool = None
+                if self.flushing_path.exists():
+                    # Left by a failed flush; its rows are part of ``batch``.
+                    _append_file(self.path, self.flushing_path)
+                else:
+                    os.replace(self.path, self.flushing_path)
+            try:
+                written = write_attempts(batch)
+            except Exception:
+                with self._lock:
+                    self._pending[:0] = batch
+                    self._flushing = []
+                raise
+            with self._lock:
+                self._flushing = []
+            self.flushing_path.unlink()
+            return written
+
+    def adopt_orphans(self):
+        """Move the spooled attempts of exited processes into this buffer.
+
+        A spool is adopted only once its owner's lock is free. The lines are
+        fsynced into this buffer's spool before the orphan files are removed.
+        Returns the number of attempts adopted.
+        """
+        adopted = 0
+        for lock_path in sorted(self.path.parent.glob(self.orphan_pattern)):
+            if lock_path == self.lock_path:
+                continue
+            orphan_lock = _lock(lock_path, wait=False)
+            if orphan_lock is None:
+                continue
+            with orphan_lock:
+                spool = lock_path.with_suffix('')
+                files = [spool.with_name(spool.name + '.flushing'), spool]
+                lines = []
+                for path in files:
+                    if path.exists():
+                        with open(path, encoding='utf-8') as source:
+                            lines += [line.rstrip('\n') for line in source if line.strip()]
+                if lines:
+                    with self._lock:
+                        self._append(lines, [deserialize(line) for line in lines])
+                    adopted += len(lines)
+                for path in files:
+                    path.unlink(missing_ok=True)
+            lock_path.unlink(missing_ok=True)
+        return adopted
+
+    def replay(self):
+        """Adopt the spools of exited processes and flush them."""
+        adopted = self.adopt_orphans()
+        if adopted:
+            logger.info("Adopted %d spooled quiz attempts", adopted)
+        return self.flush()
+
+    def close(self):
+        """Flush, then remove this buffer's files and release its lock."""
+        self.flush()
+        with self._lock:
+            if self._spool is not None:
+                self._spool.close()
+                self._spool = None
+            self._owner_lock.close()
+            for path in (self.path, self.flushing_path, self.lock_path):
+                path.unlink(missing_ok=True)
+
+    def start(self):
+        if self.interval and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='attempt-write-behind', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                if fcntl is not None:
+                    self.adopt_orphans()
+                self.flush()
+            except Exception:
+                logger.exception("Write-behind flush failed; %d attempts stay spooled", len(self))
+            finally:
+                close_old_connections()
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+
+def _append_file(source, target):
+    if source.exists():
+        with open(source, encoding='utf-8') as src, open(target, 'a', encoding='utf-8') as dst:
+            dst.write(src.read())
+        source.unlink()
+
+
+def get_buffer():
+    """The process-wide buffer; its thread adopts leftover spools on its first tick."""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            buffer = AttemptBuffer(
+                spool_path(),
+                batch_size=getattr(settings, 'LEARNING_WRITE_BEHIND_BATCH_SIZE', 500),
+                interval=getattr(settings, 'LEARNING_WRITE_BEHIND_INTERVAL', 2.0),
+            )
+            buffer.start()
+            _buffer = buffer
+    return _buffer
+
+
+def enqueue(attempt):
+    """Spool ``attempt``; returns the attempt that stands for its idempotency key."""
+    return get_buffer().add(attempt)
+
+
+def find_pending(user_id, idempotency_key):
+    if _buffer is None:
+        return None
+    return _buffer.find(user_id, idempotency_key)
+
+
+def projected_level(user_id):
+    """The user's level once their pending attempts are flushed."""
+    xp = UserProfile.objects.filter(user_id=user_id).values_list('xp', flat=True).first() or 0
+    return level_for_xp(xp + get_buffer().pending_xp(user_id))
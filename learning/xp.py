@@ -0,0 +1,60 @@
+# learning/xp.py
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import UserProfile, XPEvent
+from .progress import invalidate_dashboard
+
+XP_PER_LEVEL = 100
+
+
+def level_for_xp(xp):
+    return xp // XP_PER_LEVEL + 1
+
+
+def award_xp(user, amount, source, profile=None):
+    """Append an XPEvent and add ``amount`` to the user's profile atomically.
+
+    The total is bumped with ``F('xp') + amount`` and the level is derived in
+    the same UPDATE, so concurrent awards cannot overwrite each other. Returns
+    the profile with fresh ``xp`` and ``level`` values.
+    """
+    if profile is None:
+        profile, created = UserProfile.objects.get_or_create(user=user)
+    if not amount:
+        return profile
+    with transaction.atomic(savepoint=False):
+        XPEvent.objects.create(user=user, source=source, amount=amount)
+        profile.xp = F('xp') + amount
+        profile.level = (F('xp') + amount) / XP_PER_LEVEL + 1
+        profile.save(update_fields=['xp', 'level'])
+    profile.refresh_from_db(fields=['xp', 'level'])
+    invalidate_dashboard(user.id)
+    return profile
+
+
+def reconcile_xp(dry_run=False):
+    """Rebuild every profile's xp and level from the ledger in one UPDATE.
+
+    Returns the number of profiles whose stored total disagreed with the
+    ledger.
+    """
+    ledger_total = Coalesce(
+        Subquery(
+            XPEvent.objects.filter(user=OuterRef('user'))
+            .order_by().values('user').annotate(total=Sum('amount')).values('total')
+        ),
+        0,
+    )
+    drifted = (
+        UserProfile.objects.annotate(ledger_total=ledger_total)
+        .exclude(xp=F('ledger_total'))
+        .count()
+    )
+    if drifted and not dry_run:
+        UserProfile.objects.update(
+            xp=ledger_total,
+            level=ledger_total / XP_PER_LEVEL + 1,
+        )
+    return drifted